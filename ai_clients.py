@@ -0,0 +1,55 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_clients = {}
+_lock = threading.RLock()
+
+
+def _get_or_create(key, factory):
+    """Create each client once per process; later calls share it (and its connection pool)"""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def _api_key():
+    return os.getenv("SECRET_API_KEY")
+
+
+def gemini_model(model_name):
+    """google.generativeai GenerativeModel, configured with the API key once"""
+    def create():
+        import google.generativeai as genai
+
+        _get_or_create("generativeai", lambda: genai.configure(api_key=_api_key()) or True)
+        return genai.GenerativeModel(model_name)
+
+    return _get_or_create(("generativeai", model_name), create)
+
+
+def genai_client():
+    """google.genai Client used for image generation"""
+    def create():
+        from google import genai
+
+        return genai.Client(api_key=_api_key())
+
+    return _get_or_create("genai", create)
+
+
+def chat_model(model_name, temperature=0.1):
+    """LangChain ChatGoogleGenerativeAI for text prompts"""
+    def create():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(model=model_name, google_api_key=_api_key(), temperature=temperature)
+
+    return _get_or_create(("chat", model_name, temperature), create)
@@ -1,20 +1,29 @@
 try:
-    from process_image import process_image
+    from process_image import process_image, detect_objects_batch, generate_descriptions_batch
+    from process_image import DESCRIPTION_BATCH_SIZE, DESCRIPTION_CONCURRENCY, is_description_error
+    from description_cache import description_cache
+    from segmentation import SEGMENTATION_CACHE_TAG
+    from enhancement_planner import OPTION3_PLANNER
+    from upscalers import UPSCALER_BACKEND, UPSCALE_FACTOR, UPSCALER_MODEL_PATH
     PROCESS_IMAGE_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: process_image module not available: {e}")
     PROCESS_IMAGE_AVAILABLE = False
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import shutil
+import time
+import asyncio
+import hashlib
+import json
 import os
 import base64
 from io import BytesIO
 from PIL import Image
 import uuid
-import tempfile
 
 try:
     from search_product import search_product
@@ -30,9 +39,18 @@ except ImportError as e:
     print(f"Warning: background_generator module not available: {e}")
     BACKGROUND_GEN_AVAILABLE = False
 
+from model_registry import model_registry
+from job_queue import JobQueueFull, create_job_queue
+from processor_store import create_processor_store
+from pipeline_cache import create_pipeline_cache
+from resilience import request_budget, resilience_stats
+from payloads import PAYLOAD_POLICIES, payload_stats
+from bulk_ingest import BulkIngestion, open_source
+
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from starlette.concurrency import run_in_threadpool
 import logging
 
 # Setup logging
@@ -48,8 +66,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active processors
-processors = {}
+# Store active processors (bounded by memory budget and TTL, optionally shared between workers)
+processors = create_processor_store(restore=process_image.from_state if PROCESS_IMAGE_AVAILABLE else None)
+
+# Stage outputs of previous enhancements, keyed by input content
+pipeline_cache = create_pipeline_cache()
+
+# Bump when detection/background removal or the enhancement options change output
+SEGMENTATION_CACHE_VERSION = "1"
+OPTIONS_CACHE_VERSION = "4"
+
+# Wall-clock budgets that deadlines of external AI calls are derived from
+ENHANCE_BUDGET_SECONDS = float(os.getenv("ENHANCE_BUDGET_SECONDS", "150"))
+DESCRIPTION_BUDGET_SECONDS = float(os.getenv("DESCRIPTION_BUDGET_SECONDS", "45"))
+
+# Tone x language combinations one description request may ask for
+DESCRIPTION_MAX_VARIANTS = int(os.getenv("DESCRIPTION_MAX_VARIANTS", "12"))
+
+# Background workers for long-running pipeline jobs
+job_queue = create_job_queue()
+# Catalog runs take long; they get their own workers so they cannot hold up /jobs/enhance
+bulk_job_queue = create_job_queue("BULK_JOB", max_workers=1, max_queue_depth=4)
+
+# Uploaded catalogs and their incrementally written results, removed once a
+# finished run is older than BULK_OUTPUT_TTL_SECONDS
+BULK_OUTPUT_DIR = os.getenv("BULK_OUTPUT_DIR", ".cache/bulk")
+BULK_OUTPUT_TTL_SECONDS = float(os.getenv("BULK_OUTPUT_TTL_SECONDS", str(24 * 3600)))
+
+@app.on_event("startup")
+def warm_up_models():
+    """Eagerly load local models when WARMUP_MODELS is set (e.g. "all" or "owlvit,rembg")"""
+    warmup = os.environ.get("WARMUP_MODELS", "").strip()
+    if not warmup or warmup.lower() in ("0", "false", "no") or not PROCESS_IMAGE_AVAILABLE:
+        return
+    if warmup.lower() in ("1", "true", "yes", "all"):
+        model_registry.warm_up()
+    else:
+        model_registry.warm_up([name.strip() for name in warmup.split(",") if name.strip()])
 
 # Health check endpoint
 @app.get("/")
@@ -80,15 +133,47 @@ def pil_image_to_base64(pil_image):
     img_str = base64.b64encode(buffer.getvalue()).decode()
     return f"data:image/jpeg;base64,{img_str}"
 
-def apply_background(image: Image.Image, background: str) -> Image.Image:
-    """Apply a given base64 background image to an RGBA image"""
+def encode_image(pil_image, image_format: Optional[str] = None):
+    """
+    Encode a PIL Image to raw bytes for binary responses.
+
+    Images with transparency default to PNG, everything else to JPEG.
+    Returns the bytes and their content type.
+    """
+    if image_format is None:
+        image_format = "png" if pil_image.mode in ("RGBA", "LA", "P") else "jpeg"
+    image_format = image_format.lower()
+
+    buffer = BytesIO()
+    if image_format in ("jpeg", "jpg"):
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        pil_image.save(buffer, format='JPEG', quality=95)
+        return buffer.getvalue(), "image/jpeg"
+    if image_format == "png":
+        pil_image.save(buffer, format='PNG')
+        return buffer.getvalue(), "image/png"
+    if image_format == "webp":
+        pil_image.save(buffer, format='WEBP', quality=90)
+        return buffer.getvalue(), "image/webp"
+    raise ValueError(f"Unsupported image format: {image_format}")
+
+def load_background(background) -> Image.Image:
+    """Decode a background given as a base64 data URL string or raw bytes"""
+    if isinstance(background, (bytes, bytearray)):
+        background_data = background
+    else:
+        # Decode the base64 background image
+        background_data = base64.b64decode(background.split(",")[1])  # Remove the "data:image/...;base64," prefix
+    return Image.open(BytesIO(background_data))
+
+def apply_background(image: Image.Image, background) -> Image.Image:
+    """Apply a background image (base64 data URL string or raw bytes) to an RGBA image"""
     if image.mode != 'RGBA':
         image = image.convert("RGBA")
 
     try:
-        # Decode the base64 background image
-        background_data = base64.b64decode(background.split(",")[1])  # Remove the "data:image/...;base64," prefix
-        background_image = Image.open(BytesIO(background_data))
+        background_image = load_background(background)
 
         # Ensure the background image matches the size of the input image
         background_image = background_image.resize(image.size)
@@ -133,173 +218,697 @@ async def upload_image(image: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
-@app.post("/enhance_and_return_all_options")
-async def enhance_image(request: dict):
-    """Process image through all enhancement options using base64 data"""
-    try:
-        if not PROCESS_IMAGE_AVAILABLE:
-            raise HTTPException(status_code=503, detail="Image processing module not available")
-        
-        print(f"Received request: {type(request)}")
-        print(f"Request keys: {request.keys()}")
-        
-        # Handle different request formats
-        image_data = request.get("image_base64")
-        if image_data is None:
-            # Try alternative key names
-            image_data = request.get("base64") or request.get("imageData")
-        
-        background_color = request.get("background")
+ENHANCEMENT_STAGES = [
+    "load_image",
+    "detect_objects",
+    "remove_background",
+    "option_1",
+    "option_2",
+    "option_3",
+]
 
+def decode_enhancement_request(request: dict):
+    """Extract the image bytes and optional background from an enhancement request"""
+    print(f"Received request: {type(request)}")
+    print(f"Request keys: {request.keys()}")
+    
+    # Handle different request formats
+    image_data = request.get("image_base64")
+    if image_data is None:
+        # Try alternative key names
+        image_data = request.get("base64") or request.get("imageData")
+    
+    background_color = request.get("background")
+
+    if not image_data:
+        raise HTTPException(status_code=400, detail="image_base64 field is required")
+
+    print(f"Image data type: {type(image_data)}")
+    
+    # Handle if image_data is a dict (extract the actual base64 string)
+    if isinstance(image_data, dict):
+        # Try common keys for base64 data in dict
+        image_data = image_data.get("data") or image_data.get("base64") or image_data.get("image_base64")
         if not image_data:
-            raise HTTPException(status_code=400, detail="image_base64 field is required")
+            raise HTTPException(status_code=400, detail="No valid image data found in request")
 
-        print(f"Image data type: {type(image_data)}")
-        
-        # Handle if image_data is a dict (extract the actual base64 string)
-        if isinstance(image_data, dict):
-            # Try common keys for base64 data in dict
-            image_data = image_data.get("data") or image_data.get("base64") or image_data.get("image_base64")
-            if not image_data:
-                raise HTTPException(status_code=400, detail="No valid image data found in request")
-
-        # Ensure image_data is a string
-        if not isinstance(image_data, str):
-            raise HTTPException(status_code=400, detail=f"Image data must be a string, got {type(image_data)}")
-
-        # Decode base64 image
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',', 1)[1]
-        
-        try:
-            image_bytes = base64.b64decode(image_data)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid base64 image data: {str(e)}")
-        
-        # Create a temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_image:
-            temp_image.write(image_bytes)
-            temp_image_path = temp_image.name
+    # Ensure image_data is a string
+    if not isinstance(image_data, str):
+        raise HTTPException(status_code=400, detail=f"Image data must be a string, got {type(image_data)}")
 
-        print(f"Starting enhancement for temporary image: {temp_image_path}")
-        
-        # Create a new processor instance
-        processor_id = str(uuid.uuid4())
-        img_processor = process_image()
-        
-        # Process the image step by step
-        img_processor.process(temp_image_path)
-        
-        img_processor.raw_image.save("processed_image.png")  # Save processed image for debugging
-        
+    # Decode base64 image
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',', 1)[1]
+    
+    try:
+        image_bytes = base64.b64decode(image_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid base64 image data: {str(e)}")
+
+    return image_bytes, background_color
+
+def run_enhancement_pipeline(image_bytes: bytes, background_color=None, progress=None,
+                             on_artifact=None):
+    """
+    Run detection, background removal and the three enhancement options.
+
+    This is blocking work and must not run on the event loop. progress, when
+    given, is called as progress(stage, status) for every stage in ENHANCEMENT_STAGES,
+    and on_artifact(name, image) as soon as each output image is ready.
+    The whole run, including the external enhancement calls, is limited to
+    ENHANCE_BUDGET_SECONDS. Returns the processor id and the stored processor.
+    """
+    def report(stage, status):
+        if progress is not None:
+            progress(stage, status)
+
+    def publish(name, image):
+        if on_artifact is not None:
+            on_artifact(name, image)
+
+    with request_budget(ENHANCE_BUDGET_SECONDS):
+        return _enhancement_pipeline(image_bytes, background_color, report, publish)
+
+def _enhancement_pipeline(image_bytes, background_color, report, publish):
+    print(f"Starting enhancement for image of {len(image_bytes)} bytes")
+    
+    # Create a new processor instance
+    processor_id = str(uuid.uuid4())
+    img_processor = process_image()
+    
+    # Process the image step by step, decoding straight from memory
+    report("load_image", "running")
+    img_processor.process(image_bytes)
+    report("load_image", "completed")
+    publish("original_image", img_processor.raw_image)
+    
+    # Stage outputs are cached by the hash of the input bytes (and background for the options)
+    image_key = pipeline_cache.key(image_bytes, SEGMENTATION_CACHE_VERSION, SEGMENTATION_CACHE_TAG) if pipeline_cache else None
+    segmentation = pipeline_cache.get(image_key, "segmentation") if pipeline_cache else None
+
+    if segmentation is not None:
+        print("Step 2-3: Reusing cached detection and background removal")
+        data, images = segmentation
+        img_processor.apply_segmentation(data["crop_box"], data["detected_objects"], images["alpha_mask"])
+        report("detect_objects", "cached")
+        report("remove_background", "running")
+    else:
         print("Step 2: Detecting objects...")
+        report("detect_objects", "running")
         img_processor.detect_object()
-        
-        img_processor.cropped_image.save("detected_objects_image.png")  # Save detected objects image for debugging
+        report("detect_objects", "completed")
         print(img_processor.detected_objects)
         
         print("Step 3: Removing background...")
+        report("remove_background", "running")
         img_processor.remove_background()
+        if pipeline_cache:
+            pipeline_cache.put(
+                image_key, "segmentation",
+                {
+                    "crop_box": list(img_processor.crop_box) if img_processor.crop_box is not None else None,
+                    "detected_objects": img_processor.detected_objects
+                },
+                {"alpha_mask": img_processor.alpha_mask}
+            )
+    
+    if background_color:
+        img_processor.no_background_image = apply_background(img_processor.no_background_image, background_color)
+    report("remove_background", "completed")
+    publish("no_background_image", img_processor.no_background_image)
+
+    options_key = pipeline_cache.key(image_key, background_color, OPTIONS_CACHE_VERSION, UPSCALER_BACKEND,
+                                   UPSCALE_FACTOR, UPSCALER_MODEL_PATH, PAYLOAD_POLICIES["finegrain"].max_side,
+                                   OPTION3_PLANNER) if pipeline_cache else None
+    options = pipeline_cache.get(options_key, "options") if pipeline_cache else None
+
+    if options is not None:
+        print("Step 4: Reusing cached enhancement options")
+        _, images = options
+        for number in (1, 2, 3):
+            setattr(img_processor, f"enhanced_image_{number}", images[f"enhanced_image_{number}"])
+            report(f"option_{number}", "cached")
+            publish(f"enhanced_image_{number}", images[f"enhanced_image_{number}"])
+    else:
+        print("Step 4: Running enhancement options 1-3 concurrently...")
+        img_processor.enhance_all_options(
+            progress=report,
+            on_result=lambda number, image: publish(f"enhanced_image_{number}", image)
+        )
+        # Fallback results depend on transient failures, only cache complete runs
+        if pipeline_cache and all(status == "completed" for status in img_processor.option_status.values()):
+            pipeline_cache.put(options_key, "options", {}, {
+                f"enhanced_image_{number}": image
+                for number, image in enumerate(img_processor.get_enhanced_images(), start=1)
+            })
+    
+    # Store the processor for later use
+    processors.put(processor_id, img_processor)
+    print(f"Enhancement completed successfully. Processor ID: {processor_id}")
+    return processor_id, img_processor
+
+def enhancement_response(processor_id: str, img_processor) -> dict:
+    """Convert PIL images to base64 for JSON response"""
+    return {
+        "processor_id": processor_id,
+        "enhanced_image_1": pil_image_to_base64(img_processor.enhanced_image_1),
+        "enhanced_image_2": pil_image_to_base64(img_processor.enhanced_image_2),
+        "enhanced_image_3": pil_image_to_base64(img_processor.enhanced_image_3),
+        "original_image": pil_image_to_base64(img_processor.raw_image),
+        "no_background_image": pil_image_to_base64(img_processor.no_background_image)
+    }
+
+def run_enhancement_job(image_bytes: bytes, background_color=None, progress=None):
+    """Job queue entry point: run the pipeline and return the JSON-ready response"""
+    processor_id, img_processor = run_enhancement_pipeline(image_bytes, background_color, progress=progress)
+    return enhancement_response(processor_id, img_processor)
+
+# Image names served by /processors/{processor_id}/images/{name}
+PROCESSOR_IMAGE_FIELDS = {
+    "original_image": "raw_image",
+    "cropped_image": "cropped_image",
+    "no_background_image": "no_background_image",
+    "enhanced_image_1": "enhanced_image_1",
+    "enhanced_image_2": "enhanced_image_2",
+    "enhanced_image_3": "enhanced_image_3",
+    "chosen_image": "chosen_image",
+}
+
+def enhancement_urls(processor_id: str) -> dict:
+    """URLs of the binary images of a processor, for responses that skip base64"""
+    names = ["original_image", "no_background_image", "enhanced_image_1", "enhanced_image_2", "enhanced_image_3"]
+    return {
+        "processor_id": processor_id,
+        **{name: f"/processors/{processor_id}/images/{name}" for name in names}
+    }
+
+@app.post("/enhance_and_return_all_options")
+async def enhance_image(request: dict):
+    """Process image through all enhancement options using base64 data"""
+    try:
+        if not PROCESS_IMAGE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Image processing module not available")
         
-        if background_color:
-            img_processor.no_background_image = apply_background(img_processor.no_background_image, background_color)
-        
-        img_processor.no_background_image.save("no_background_image.png")  # Save no background image for debugging
-        
-        print("Step 4: Enhancement option 1...")
-        try:
-            img_processor.enhance_image_option1()
-            print("Enhancement option 1 completed")
-        except Exception as e:
-            print(f"Enhancement option 1 failed: {str(e)}")
-            img_processor.enhanced_image_1 = img_processor.no_background_image
+        image_bytes, background_color = decode_enhancement_request(request)
+
+        # The pipeline is blocking, keep it off the event loop
+        return await run_in_threadpool(run_enhancement_job, image_bytes, background_color)
         
-        print("Step 5: Enhancement option 2...")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error during enhancement: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error enhancing image: {str(e)}")
+
+def format_sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/enhance_and_stream_all_options")
+async def enhance_image_stream(request: dict):
+    """
+    Same pipeline as /enhance_and_return_all_options, streamed as Server-Sent Events.
+
+    Each image is pushed as an "artifact" event as soon as its stage finishes,
+    followed by a final "done" event carrying the processor id.
+    """
+    if not PROCESS_IMAGE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Image processing module not available")
+
+    image_bytes, background_color = decode_enhancement_request(request)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def on_artifact(name, image):
+        # Encode in the pipeline thread so the event loop only forwards strings
+        emit("artifact", {"name": name, "image": pil_image_to_base64(image)})
+
+    def run():
         try:
-            img_processor.enhance_image_option2()
-            print("Enhancement option 2 completed")
+            processor_id, _ = run_enhancement_pipeline(
+                image_bytes, background_color,
+                progress=lambda stage, status: emit("progress", {"stage": stage, "status": status}),
+                on_artifact=on_artifact
+            )
+            emit("done", {"processor_id": processor_id})
         except Exception as e:
-            print(f"Enhancement option 2 failed: {str(e)}")
-            img_processor.enhanced_image_2 = img_processor.no_background_image
-        
-        print("Step 6: Enhancement option 3...")
+            print(f"Error during streamed enhancement: {str(e)}")
+            emit("error", {"detail": f"Error enhancing image: {str(e)}"})
+
+    async def event_stream():
+        task = loop.run_in_executor(None, run)
+        while True:
+            event, data = await events.get()
+            yield format_sse(event, data)
+            if event in ("done", "error"):
+                break
+        await task
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/enhance")
+async def enhance_image_binary(image: UploadFile = File(...), background: Optional[UploadFile] = File(None)):
+    """
+    Multipart variant of /enhance_and_return_all_options.
+
+    Takes the image (and optional background) as raw file uploads and returns
+    only URLs; fetch the images from /processors/{processor_id}/images/{name}.
+    """
+    try:
+        if not PROCESS_IMAGE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Image processing module not available")
+        if not image.content_type or not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+        image_bytes = await image.read()
+        background_bytes = await background.read() if background is not None else None
+
+        processor_id, _ = await run_in_threadpool(run_enhancement_pipeline, image_bytes, background_bytes or None)
+        return enhancement_urls(processor_id)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error during enhancement: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error enhancing image: {str(e)}")
+
+def image_etag(processor_id: str, img_processor, field: str, image_format: Optional[str]):
+    """
+    ETag of a stored image from the version the processor store stamped on it.
+
+    chosen_image follows the enhanced image of the chosen option. Returns None
+    when the image has no version yet.
+    """
+    if field == "chosen_image":
+        field = f"enhanced_image_{img_processor.chosen_option}"
+    version = getattr(img_processor, "image_versions", {}).get(field)
+    if version is None:
+        return None
+    tag = hashlib.sha256(f"{processor_id}:{field}:{version}:{(image_format or '').lower()}".encode()).hexdigest()
+    return f'"{tag[:32]}"'
+
+@app.get("/processors/{processor_id}/images/{name}")
+async def get_processor_image(processor_id: str, name: str, request: Request, format: Optional[str] = None):
+    """Return one image of a processor as raw bytes with its content type and an ETag"""
+    field = PROCESSOR_IMAGE_FIELDS.get(name)
+    if field is None:
+        raise HTTPException(status_code=404, detail=f"Unknown image name: {name}")
+
+    img_processor = await run_in_threadpool(processors.get, processor_id)
+    if img_processor is None:
+        raise HTTPException(status_code=404, detail="Processor not found. Please enhance image first.")
+    pil_image = getattr(img_processor, field)
+    if pil_image is None:
+        raise HTTPException(status_code=404, detail=f"Image {name} is not available")
+
+    # Revalidation is answered from the stored image version, without encoding
+    etag = image_etag(processor_id, img_processor, field, format)
+    headers = {"Cache-Control": "private, max-age=3600"}
+    if etag is not None:
+        headers["ETag"] = etag
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+    try:
+        image_data, content_type = await run_in_threadpool(encode_image, pil_image, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if etag is None:
+        headers["ETag"] = f'"{hashlib.sha256(image_data).hexdigest()[:32]}"'
+    return Response(content=image_data, media_type=content_type, headers=headers)
+
+@app.post("/processors/{processor_id}/recomposite")
+async def recomposite_background(processor_id: str, request: dict, persist: bool = False,
+                                 format: Optional[str] = None):
+    """
+    Paste the product onto a different background reusing the stored alpha mask.
+
+    Takes {"background": "data:image/...;base64,..."} and returns the composite
+    as raw image bytes. With persist=true it also replaces the processor's
+    no_background_image (the enhancement options are not re-run).
+    """
+    background = request.get("background")
+    if not background or not isinstance(background, str):
+        raise HTTPException(status_code=400, detail="background field is required")
+
+    img_processor = await run_in_threadpool(processors.get, processor_id)
+    if img_processor is None:
+        raise HTTPException(status_code=404, detail="Processor not found. Please enhance image first.")
+    if img_processor.alpha_mask is None:
+        raise HTTPException(status_code=409, detail="Processor has no stored alpha mask")
+
+    try:
+        # Decoding, resizing and pasting the background is blocking work
+        combined_image = await run_in_threadpool(
+            lambda: img_processor.composite_on(load_background(background))
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error applying background: {str(e)}")
+
+    if persist:
+        img_processor.no_background_image = combined_image
+        await run_in_threadpool(processors.update, processor_id, img_processor, ("no_background_image",))
+
+    try:
+        image_data, content_type = await run_in_threadpool(encode_image, combined_image, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=image_data, media_type=content_type)
+
+@app.post("/jobs/enhance", status_code=202)
+async def submit_enhancement_job(request: dict):
+    """Queue an enhancement and return a job id to poll at /jobs/{job_id}"""
+    if not PROCESS_IMAGE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Image processing module not available")
+
+    image_bytes, background_color = decode_enhancement_request(request)
+    try:
+        job = job_queue.submit("enhance", run_enhancement_job, image_bytes, background_color,
+                               stages=ENHANCEMENT_STAGES)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+def run_bulk_job(run_id: str, catalog_path: str, describe: bool, option: int, progress=None):
+    """Job queue entry point: stream an uploaded catalog through the bulk pipeline"""
+    run_dir = os.path.join(BULK_OUTPUT_DIR, run_id)
+    ingestion = BulkIngestion(os.path.join(run_dir, "output"), describe=describe, option=option, progress=progress)
+    try:
+        summary = ingestion.run(open_source(catalog_path, allow_paths=False, allow_urls=False))
+    finally:
+        os.unlink(catalog_path)
+    return {
+        "run_id": run_id,
+        "items": summary["items"],
+        "completed": summary["completed"],
+        "failed": summary["failed"],
+        "seconds": summary["seconds"],
+        "results_url": f"/bulk/{run_id}/results.ndjson",
+    }
+
+def is_run_id(value: str) -> bool:
+    """Whether value is a run id as created by /jobs/bulk_ingest (keeps paths inside BULK_OUTPUT_DIR)"""
+    try:
+        return str(uuid.UUID(value)) == value
+    except ValueError:
+        return False
+
+def purge_bulk_runs():
+    """Remove run directories of finished bulk runs older than BULK_OUTPUT_TTL_SECONDS"""
+    if not os.path.isdir(BULK_OUTPUT_DIR):
+        return
+    cutoff = time.time() - BULK_OUTPUT_TTL_SECONDS
+    for run_id in os.listdir(BULK_OUTPUT_DIR):
+        run_dir = os.path.join(BULK_OUTPUT_DIR, run_id)
         try:
-            img_processor.enhance_image_option3()
-            print("✓ Enhancement option 3 completed")
-        except Exception as e:
-            print(f"Enhancement option 3 failed: {str(e)}")
-            img_processor.enhanced_image_3 = img_processor.no_background_image
-        
-        # Store the processor for later use
-        processors[processor_id] = img_processor
-        print(f"Enhancement completed successfully. Processor ID: {processor_id}")
-        
-        # Clean up the temporary file
-        os.unlink(temp_image_path)
-        
-        # Convert PIL images to base64 for JSON response
+            # The uploaded catalog is deleted when its run ends, so queued and running runs still have it
+            if not is_run_id(run_id) or any(name.startswith("catalog") for name in os.listdir(run_dir)):
+                continue
+            results_path = os.path.join(run_dir, "output", "results.ndjson")
+            last_written = os.path.getmtime(results_path if os.path.exists(results_path) else run_dir)
+        except OSError:
+            continue  # removed concurrently
+        if last_written < cutoff:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+@app.post("/jobs/bulk_ingest", status_code=202)
+async def submit_bulk_ingest(catalog: UploadFile = File(...), describe: bool = True, option: int = 1):
+    """Queue a ZIP of images or an NDJSON manifest for bulk processing"""
+    if not PROCESS_IMAGE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Image processing module not available")
+    if option not in (1, 2, 3):
+        raise HTTPException(status_code=400, detail="Invalid option number. Choose 1, 2, or 3.")
+
+    name = (catalog.filename or "").lower()
+    if name.endswith(".zip"):
+        extension = ".zip"
+    elif name.endswith((".ndjson", ".jsonl")):
+        extension = ".ndjson"
+    else:
+        raise HTTPException(status_code=400, detail="Catalog must be a .zip archive or an .ndjson manifest")
+
+    await run_in_threadpool(purge_bulk_runs)
+
+    # Spool the upload to disk; ZIP members are then read one at a time
+    run_id = str(uuid.uuid4())
+    run_dir = os.path.join(BULK_OUTPUT_DIR, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    catalog_path = os.path.join(run_dir, "catalog" + extension)
+    with open(catalog_path, "wb") as f:
+        await run_in_threadpool(shutil.copyfileobj, catalog.file, f)
+
+    stages = ["segment", "enhance"] + (["describe"] if describe else [])
+    try:
+        job = bulk_job_queue.submit("bulk_ingest", run_bulk_job, run_id, catalog_path, describe, option, stages=stages)
+    except JobQueueFull as e:
+        os.unlink(catalog_path)
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "results_url": f"/bulk/{run_id}/results.ndjson",
+    }
+
+@app.get("/bulk/{run_id}/{file_path:path}")
+async def get_bulk_file(run_id: str, file_path: str):
+    """Results (results.ndjson, written as items finish) and images of a bulk run"""
+    if not is_run_id(run_id):
+        raise HTTPException(status_code=404, detail="File not found")
+    output_dir = os.path.realpath(os.path.join(BULK_OUTPUT_DIR, run_id, "output"))
+    full_path = os.path.realpath(os.path.join(output_dir, file_path))
+    if not full_path.startswith(output_dir + os.sep) or not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = "application/x-ndjson" if full_path.endswith(".ndjson") else None
+    return FileResponse(full_path, media_type=media_type)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report per-stage progress of a job and its result once completed"""
+    job = job_queue.get(job_id) or bulk_job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/detect_batch")
+async def detect_batch(images: List[UploadFile] = File(...), max_batch_size: Optional[int] = None):
+    """Detect and crop the product in many uploaded images using batched forward passes"""
+    try:
+        if not PROCESS_IMAGE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Image processing module not available")
+
+        pil_images = []
+        for image in images:
+            if not image.content_type or not image.content_type.startswith('image/'):
+                raise HTTPException(status_code=400, detail=f"File {image.filename} must be an image")
+            image_data = await image.read()
+            try:
+                pil_images.append(Image.open(BytesIO(image_data)).convert("RGB"))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid image {image.filename}: {str(e)}")
+
+        print(f"Detecting objects in batch of {len(pil_images)} images...")
+        detections = await run_in_threadpool(detect_objects_batch, pil_images, max_batch_size)
+
         return {
-            "processor_id": processor_id,
-            "enhanced_image_1": pil_image_to_base64(img_processor.enhanced_image_1),
-            "enhanced_image_2": pil_image_to_base64(img_processor.enhanced_image_2),
-            "enhanced_image_3": pil_image_to_base64(img_processor.enhanced_image_3),
-            "original_image": pil_image_to_base64(img_processor.raw_image),
-            "no_background_image": pil_image_to_base64(img_processor.no_background_image)
+            "results": [
+                {
+                    "filename": image.filename,
+                    "labels": detection["labels"],
+                    "crop_box": detection["crop_box"],
+                    "cropped_image": pil_image_to_base64(detection["cropped_image"])
+                }
+                for image, detection in zip(images, detections)
+            ]
         }
-        
+
     except HTTPException:
         raise
     except Exception as e:
-        # Clean up temp file on error
-        if 'temp_image_path' in locals() and os.path.exists(temp_image_path):
-            os.unlink(temp_image_path)
-        
-        print(f"Error during enhancement: {str(e)}")
+        print(f"Error during batch detection: {str(e)}")
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error enhancing image: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error detecting objects: {str(e)}")
+
+def split_locales(values, default):
+    """Query values as a de-duplicated list, accepting repeated and comma-separated values"""
+    items = []
+    for value in values or [default]:
+        for item in value.split(","):
+            item = item.strip()
+            if item and item not in items:
+                items.append(item)
+    return items or [default]
+
+def describe_chosen_image(img_processor, variants):
+    """Blocking: generate all (tone, lang) variants under one description budget"""
+    with request_budget(DESCRIPTION_BUDGET_SECONDS):
+        return img_processor.generate_descriptions(variants)
 
 @app.post("/choose_image_and_generate_description")
 async def choose_image_and_generate_description(
     processor_id: str,
-    option_number: int
+    option_number: int,
+    tone: List[str] = Query(["professional"]),
+    lang: List[str] = Query(["en"])
 ):
-    """Choose an enhanced image option and generate description"""
+    """
+    Choose an enhanced image option and generate description.
+
+    tone and lang may be repeated or comma-separated (e.g. lang=en,de,fr); every
+    tone/language combination is generated from one image encode, concurrently.
+    """
     try:
         # Get the processor instance
-        if processor_id not in processors:
+        img_processor = await run_in_threadpool(processors.get, processor_id)
+        if img_processor is None:
             raise HTTPException(status_code=404, detail="Processor not found. Please enhance image first.")
         
-        img_processor = processors[processor_id]
-        
         # Choose the image
         img_processor.choose_image(option_number)
         
         # Generate description
-        description = img_processor.generate_description()
+        variants = [(t, l) for t in split_locales(tone, "professional") for l in split_locales(lang, "en")]
+        if len(variants) > DESCRIPTION_MAX_VARIANTS:
+            raise HTTPException(status_code=400, detail=f"At most {DESCRIPTION_MAX_VARIANTS} tone/language combinations per request")
+        descriptions = await run_in_threadpool(describe_chosen_image, img_processor, variants)
+        await run_in_threadpool(processors.update, processor_id, img_processor)
         
         return {
             "chosen_image": pil_image_to_base64(img_processor.chosen_image),
-            "description": description,
+            "description": img_processor.description,
+            "descriptions": descriptions,
             "option_number": option_number
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating description: {str(e)}") 
 
+def decode_description_batch(request: dict):
+    """Items of a batch description request as (processor_id, option_number) pairs"""
+    if "items" in request:
+        try:
+            items = [(str(item["processor_id"]), int(item.get("option_number", 1))) for item in request["items"]]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise HTTPException(status_code=400, detail="Each item needs a processor_id and an option_number")
+    elif "processor_ids" in request:
+        option_number = int(request.get("option_number", 1))
+        items = [(str(processor_id), option_number) for processor_id in request["processor_ids"]]
+    else:
+        raise HTTPException(status_code=400, detail="Provide 'items' or 'processor_ids'")
+    if not items:
+        raise HTTPException(status_code=400, detail="No processors to describe")
+    return items, request.get("tone", "professional"), request.get("lang", "en")
+
+def run_description_batch(items, tone="professional", lang="en", progress=None):
+    """
+    Choose an option and describe many stored processors.
+
+    Processors are loaded one window at a time (enough to keep every concurrent
+    prompt full), described with generate_descriptions_batch and written back,
+    so memory does not grow with the number of items. Returns one dict per item.
+    """
+    window_size = DESCRIPTION_BATCH_SIZE * DESCRIPTION_CONCURRENCY
+    results = []
+    if progress is not None:
+        progress("describe", "running")
+    for start in range(0, len(items), window_size):
+        window = []
+        for processor_id, option_number in items[start:start + window_size]:
+            result = {"processor_id": processor_id, "option_number": option_number}
+            results.append(result)
+            img_processor = processors.get(processor_id)
+            if img_processor is None:
+                result.update({"status": "failed", "error": "Processor not found"})
+                continue
+            try:
+                img_processor.choose_image(option_number)
+            except ValueError as e:
+                result.update({"status": "failed", "error": str(e)})
+                continue
+            if img_processor.chosen_image is None:
+                result.update({"status": "failed", "error": "Chosen option has no image"})
+                continue
+            window.append((result, img_processor))
+
+        if not window:
+            continue
+        descriptions = generate_descriptions_batch([p.chosen_image for _, p in window], tone, lang)
+        for (result, img_processor), description in zip(window, descriptions):
+            if len(description) > 15000:
+                description = description[:15000] + "..."
+            img_processor.description = description
+            img_processor.descriptions = [{"tone": tone, "lang": lang, "description": description}]
+            processors.update(result["processor_id"], img_processor)
+            failed = is_description_error(description)
+            result.update({"status": "failed" if failed else "completed", "description": description})
+    if progress is not None:
+        progress("describe", "completed")
+    return results
+
+@app.post("/describe_batch")
+async def describe_batch(request: dict):
+    """Choose an option and generate descriptions for many processors at once"""
+    if not PROCESS_IMAGE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Image processing module not available")
+    items, tone, lang = decode_description_batch(request)
+    results = await run_in_threadpool(run_description_batch, items, tone, lang)
+    return {"results": results}
+
+@app.post("/jobs/describe_batch", status_code=202)
+async def submit_description_batch(request: dict):
+    """Queue a batch description (for large catalogs) and return a job id to poll"""
+    if not PROCESS_IMAGE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Image processing module not available")
+    items, tone, lang = decode_description_batch(request)
+    try:
+        job = job_queue.submit("describe_batch", run_description_batch, items, tone, lang, stages=["describe"])
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
 @app.delete("/cleanup/{processor_id}")
 async def cleanup_processor(processor_id: str):
     """Clean up processor instance to free memory"""
-    if processor_id in processors:
-        del processors[processor_id]
+    if await run_in_threadpool(processors.delete, processor_id):
         return {"message": "Processor cleaned up successfully"}
     else:
         raise HTTPException(status_code=404, detail="Processor not found")
 
+def collect_status():
+    """Blocking: the processor store may have to query SQLite"""
+    return {
+        "status": "healthy",
+        "active_processors": len(processors),
+        "processor_store": processors.stats(),
+        "pipeline_cache": pipeline_cache.stats() if pipeline_cache else None,
+        "jobs": job_queue.stats(),
+        "bulk_jobs": bulk_job_queue.stats(),
+        "models": model_registry.stats(),
+        "upscaler": model_registry.get("upscaler").stats() if model_registry.is_loaded("upscaler") else None,
+        "external_services": resilience_stats(),
+        "payloads": payload_stats(),
+        "description_cache": description_cache.stats() if PROCESS_IMAGE_AVAILABLE and description_cache else None
+    }
+
 @app.get("/status")
 async def status_check():
-    """Status check endpoint with processor count"""
-    return {"status": "healthy", "active_processors": len(processors)}
+    """Status check endpoint with processor count and loaded models"""
+    return await run_in_threadpool(collect_status)
 
 @app.get("/health")
 async def health_check():
@@ -385,7 +994,15 @@ def gradio_interface():
     
     - **POST /upload** - Upload an image file
     - **POST /enhance_and_return_all_options** - Process image through all enhancement options
+    - **POST /enhance** - Multipart upload variant returning image URLs instead of base64
+    - **GET /processors/{processor_id}/images/{name}** - Raw image bytes of a processed image
+    - **POST /processors/{processor_id}/recomposite** - Preview the product on another background without re-segmenting
+    - **POST /enhance_and_stream_all_options** - Same as above, streaming each image as Server-Sent Events
+    - **POST /jobs/enhance** - Queue an enhancement job and poll **GET /jobs/{job_id}** for progress
+    - **POST /jobs/bulk_ingest** - Process a ZIP or NDJSON catalog; results stream to **GET /bulk/{run_id}/results.ndjson**
+    - **POST /detect_batch** - Detect and crop products in many images at once
     - **POST /choose_image_and_generate_description** - Choose enhanced image and generate description
+    - **POST /describe_batch** - Describe many processors with batched, concurrent prompts (**POST /jobs/describe_batch** to queue)
     - **POST /get_search_results** - Get search results for a query
     - **POST /generate_background** - Generate background using AI
     - **GET /status** - Health check endpoint
@@ -2,9 +2,9 @@ import mimetypes
 import os
 import time
 import uuid
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from ai_clients import genai_client
 
 
 load_dotenv()
@@ -18,9 +18,7 @@ class BackgroundGenerator:
 
 
     def generate(self, prompt):
-        client = genai.Client(
-            api_key=os.getenv("SECRET_API_KEY"),
-        )
+        client = genai_client()
 
         model = "gemini-2.0-flash-preview-image-generation"
         contents = [
@@ -0,0 +1,326 @@
+"""
+Bulk catalog ingestion: run many images through the enhancement pipeline.
+
+Usage: python bulk_ingest.py SOURCE --output DIR [--no-describe] [--option 1]
+       [--segment-workers 1] [--enhance-workers 2] [--describe-workers 2]
+
+SOURCE is a directory of images, a ZIP archive or an NDJSON manifest with one
+{"id": ..., "path" | "url" | "image_base64": ...} object per line. Results are
+written to DIR as they complete: one folder of PNGs per item plus a line per
+item in DIR/results.ndjson, which is started afresh on every run.
+"""
+import argparse
+import base64
+import json
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import zipfile
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+
+# Worker threads per pipeline stage and items buffered between stages
+BULK_SEGMENT_WORKERS = int(os.getenv("BULK_SEGMENT_WORKERS", "1"))
+BULK_ENHANCE_WORKERS = int(os.getenv("BULK_ENHANCE_WORKERS", "2"))
+BULK_DESCRIBE_WORKERS = int(os.getenv("BULK_DESCRIBE_WORKERS", "2"))
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "4"))
+# Largest uncompressed ZIP member read into memory
+BULK_MAX_MEMBER_MB = float(os.getenv("BULK_MAX_MEMBER_MB", "50"))
+
+# Images written for every item
+OUTPUT_IMAGES = ("no_background_image", "enhanced_image_1", "enhanced_image_2", "enhanced_image_3")
+
+_END = object()
+
+
+class CatalogItem:
+    """One catalog image on its way through the pipeline"""
+
+    def __init__(self, index, item_id, image_bytes=None, error=None):
+        self.index = index
+        self.id = item_id
+        self.image_bytes = image_bytes
+        self.processor = None
+        self.error = error
+        self.failed_stage = "load" if error else None
+        self.started_at = time.monotonic()
+
+
+def _is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(name).startswith(".")
+
+
+def iter_directory(path):
+    """(id, bytes) for every image below path, in sorted order"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if _is_image_name(name):
+                full_path = os.path.join(root, name)
+                with open(full_path, "rb") as f:
+                    yield os.path.relpath(full_path, path), f.read()
+
+
+def iter_zip(source, max_member_bytes=None):
+    """
+    (id, bytes) for every image in a ZIP archive, read one member at a time.
+
+    Members larger than max_member_bytes uncompressed (BULK_MAX_MEMBER_MB by
+    default) yield (id, exception) instead of being decompressed.
+    """
+    if max_member_bytes is None:
+        max_member_bytes = int(BULK_MAX_MEMBER_MB * 1024 * 1024)
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_image_name(info.filename):
+                continue
+            # zipfile stops decompressing at the declared size, so checking it is enough
+            if info.file_size > max_member_bytes:
+                yield info.filename, ValueError(
+                    f"member is {info.file_size / 1024 / 1024:.1f} MB uncompressed, "
+                    f"the limit is {max_member_bytes / 1024 / 1024:.1f} MB"
+                )
+                continue
+            yield info.filename, archive.read(info)
+
+
+def iter_manifest(lines, base_dir=".", allow_paths=True, allow_urls=True):
+    """
+    (id, bytes) for every line of an NDJSON manifest.
+
+    Each line holds "path" (relative to base_dir), "url" or "image_base64",
+    and optionally an "id". A line that cannot be read yields (id, exception).
+    Uploaded manifests pass allow_paths=False and allow_urls=False so they
+    cannot read server files or make the server fetch arbitrary addresses.
+    """
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        item_id = f"line-{number}"
+        try:
+            entry = json.loads(line)
+            item_id = str(entry.get("id", item_id))
+            if "image_base64" in entry:
+                data = entry["image_base64"]
+                yield item_id, base64.b64decode(data.split(",", 1)[1] if data.startswith("data:") else data)
+            elif "url" in entry and allow_urls:
+                import requests
+
+                response = requests.get(entry["url"], timeout=30)
+                response.raise_for_status()
+                yield item_id, response.content
+            elif "path" in entry and allow_paths:
+                with open(os.path.join(base_dir, entry["path"]), "rb") as f:
+                    yield item_id, f.read()
+            else:
+                sources = [name for name, allowed in (("path", allow_paths), ("url", allow_urls)) if allowed]
+                raise ValueError(f"manifest line needs {', '.join(repr(name) for name in sources + ['image_base64'])}")
+        except Exception as e:
+            yield item_id, e
+
+
+def open_source(path, allow_paths=True, allow_urls=True):
+    """Pick the reader for a directory, ZIP archive or NDJSON manifest"""
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if zipfile.is_zipfile(path):
+        return iter_zip(path)
+    if path.lower().endswith((".ndjson", ".jsonl")):
+        def read_manifest():
+            with open(path, encoding="utf-8") as f:
+                yield from iter_manifest(f, base_dir=os.path.dirname(os.path.abspath(path)),
+                                         allow_paths=allow_paths, allow_urls=allow_urls)
+        return read_manifest()
+    raise ValueError(f"Unsupported catalog source: {path} (expected a directory, .zip or .ndjson)")
+
+
+def _safe_name(index, item_id):
+    stem = os.path.splitext(item_id)[0]
+    return f"{index:06d}_{re.sub(r'[^A-Za-z0-9._-]+', '_', stem)[:80]}"
+
+
+class BulkIngestion:
+    """
+    Pipelined catalog processing.
+
+    Stages (segment -> enhance -> describe) run on their own worker threads
+    and hand items to each other through bounded queues. A single writer saves
+    each finished item and then drops it. At most the stage workers plus the
+    queued items are held in memory at once, however large the catalog is.
+    A failing item is recorded with its error and does not stop the others.
+    """
+
+    def __init__(self, output_dir, describe=True, option=1, segment_workers=BULK_SEGMENT_WORKERS,
+                 enhance_workers=BULK_ENHANCE_WORKERS, describe_workers=BULK_DESCRIBE_WORKERS,
+                 queue_size=BULK_QUEUE_SIZE, progress=None):
+        self.output_dir = output_dir
+        self.results_path = os.path.join(output_dir, "results.ndjson")
+        self.describe = describe
+        self.option = option
+        self.progress = progress
+        self.queue_size = queue_size
+        self.stages = [("segment", self._segment, segment_workers), ("enhance", self._enhance, enhance_workers)]
+        if describe:
+            self.stages.append(("describe", self._describe, describe_workers))
+        self.counts = {"items": 0, "completed": 0, "failed": 0}
+
+    def run(self, source):
+        """Process every (id, bytes) pair of source; returns a summary once all are written"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._produce, args=(source, queues[0]), daemon=True)]
+        for position, (name, fn, workers) in enumerate(self.stages):
+            remaining = [workers]
+            lock = threading.Lock()
+            for _ in range(workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(name, fn, queues[position], queues[position + 1], remaining, lock),
+                    name=f"bulk-{name}", daemon=True
+                ))
+            self._report(name, "running")
+        for thread in threads:
+            thread.start()
+
+        started = time.monotonic()
+        # A rerun into the same directory replaces the results instead of appending duplicates
+        with open(self.results_path, "w", encoding="utf-8") as results:
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    break
+                self._write(item, results)
+
+        for thread in threads:
+            thread.join()
+        return {
+            **self.counts,
+            "output_dir": self.output_dir,
+            "results": self.results_path,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+
+    def _report(self, stage, status):
+        if self.progress is not None:
+            self.progress(stage, status)
+
+    def _produce(self, source, out_queue):
+        index = 0
+        try:
+            for index, (item_id, data) in enumerate(source):
+                if isinstance(data, Exception):
+                    out_queue.put(CatalogItem(index, item_id, error=str(data)))
+                else:
+                    out_queue.put(CatalogItem(index, item_id, data))
+        except Exception as e:
+            # A broken archive or manifest ends the run but keeps what was already read
+            out_queue.put(CatalogItem(index + 1, "source", error=f"Reading the catalog failed: {str(e)}"))
+        finally:
+            out_queue.put(_END)
+
+    def _work(self, name, fn, in_queue, out_queue, remaining, lock):
+        while True:
+            item = in_queue.get()
+            if item is _END:
+                # Let sibling workers see the end too; the last one passes it on
+                in_queue.put(_END)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self._report(name, "completed")
+                    out_queue.put(_END)
+                return
+            if item.error is None:
+                try:
+                    fn(item)
+                except Exception as e:
+                    print(f"Bulk item {item.id} failed in {name}: {str(e)}")
+                    traceback.print_exc()
+                    item.error = str(e)
+                    item.failed_stage = name
+            out_queue.put(item)
+
+    def _segment(self, item):
+        from process_image import process_image
+
+        item.processor = process_image()
+        item.processor.process(item.image_bytes)
+        item.image_bytes = None
+        item.processor.detect_object()
+        item.processor.remove_background()
+
+    def _enhance(self, item):
+        item.processor.enhance_all_options()
+
+    def _describe(self, item):
+        item.processor.choose_image(self.option)
+        item.processor.generate_description()
+
+    def _write(self, item, results):
+        folder = _safe_name(item.index, item.id)
+        record = {"id": item.id, "index": item.index}
+        processor = item.processor
+        if item.error is None:
+            os.makedirs(os.path.join(self.output_dir, folder), exist_ok=True)
+            images = {}
+            for name in OUTPUT_IMAGES:
+                image = getattr(processor, name)
+                if image is not None:
+                    relative_path = f"{folder}/{name}.png"
+                    image.save(os.path.join(self.output_dir, relative_path), format="PNG")
+                    images[name] = relative_path
+            record.update({
+                "status": "completed",
+                "detected_objects": processor.detected_objects,
+                "option_status": processor.option_status,
+                "chosen_option": processor.chosen_option,
+                "description": processor.description,
+                "images": images,
+            })
+            self.counts["completed"] += 1
+        else:
+            record.update({"status": "failed", "stage": item.failed_stage, "error": item.error})
+            self.counts["failed"] += 1
+        record["seconds"] = round(time.monotonic() - item.started_at, 3)
+        self.counts["items"] += 1
+
+        results.write(json.dumps(record) + "\n")
+        results.flush()
+        # Drop the images as soon as they are on disk
+        item.processor = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="directory, .zip archive or .ndjson manifest")
+    parser.add_argument("--output", required=True, help="directory for images and results.ndjson")
+    parser.add_argument("--no-describe", action="store_true", help="skip description generation")
+    parser.add_argument("--option", type=int, default=1, choices=(1, 2, 3), help="option to describe")
+    parser.add_argument("--segment-workers", type=int, default=BULK_SEGMENT_WORKERS)
+    parser.add_argument("--enhance-workers", type=int, default=BULK_ENHANCE_WORKERS)
+    parser.add_argument("--describe-workers", type=int, default=BULK_DESCRIBE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=BULK_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    ingestion = BulkIngestion(
+        args.output,
+        describe=not args.no_describe,
+        option=args.option,
+        segment_workers=args.segment_workers,
+        enhance_workers=args.enhance_workers,
+        describe_workers=args.describe_workers,
+        queue_size=args.queue_size,
+        progress=lambda stage, status: print(f"Stage {stage}: {status}"),
+    )
+    summary = ingestion.run(open_source(args.source))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from PIL import Image
+
+# dHash is 64 bits; near-duplicate lookup splits it into 8 bands of 8 bits, so
+# any hash within 7 bits of a cached one shares at least one band with it
+HASH_BANDS = 8
+BAND_BITS = 8
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash of an image.
+
+    Transparent areas are flattened on white first, so a cut-out product hashes
+    the same as its listing image. The image is reduced to (hash_size + 1) x
+    hash_size grey pixels and each bit says whether a pixel is brighter than its
+    right neighbour, which survives rescaling, recompression and small edits.
+    """
+    if "A" in image.getbands():
+        rgba = image.convert("RGBA")
+        flattened = Image.new("RGB", image.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.split()[-1])
+        image = flattened
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def colour_signature(image):
+    """
+    Mean colour of an image as a packed 24-bit RGB integer.
+
+    dHash only sees brightness edges, so a red and a green product of the same
+    shape hash alike; this tells them apart. Transparent pixels are left out,
+    so a cut-out product is described by its own colour.
+    """
+    # Reduce before converting so only 256 pixels are converted
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    small = image.resize((16, 16), Image.Resampling.BOX, reducing_gap=2.0).convert("RGBA")
+    totals = [0, 0, 0]
+    weight = 0
+    pixels = small.tobytes()
+    for offset in range(0, len(pixels), 4):
+        alpha = pixels[offset + 3]
+        totals[0] += pixels[offset] * alpha
+        totals[1] += pixels[offset + 1] * alpha
+        totals[2] += pixels[offset + 2] * alpha
+        weight += alpha
+    if not weight:
+        return 0xFFFFFF
+    r, g, b = (round(total / weight) for total in totals)
+    return (r << 16) | (g << 8) | b
+
+
+def colour_distance(a, b):
+    """Largest per-channel difference between two colour signatures"""
+    return max(abs(((a >> shift) & 0xFF) - ((b >> shift) & 0xFF)) for shift in (16, 8, 0))
+
+
+def image_key(image):
+    """(dhash, colour signature) of an image; compute it once and pass it to get and put"""
+    return dhash(image), colour_signature(image)
+
+
+def _bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(band, (value >> (band * BAND_BITS)) & mask) for band in range(HASH_BANDS)]
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class DescriptionCache:
+    """
+    Generated descriptions keyed by image (perceptual hash and mean colour),
+    version, tone and language.
+
+    The version names the model and prompt that produced a description, so a
+    new model or prompt does not get old listings. Entries live in memory with
+    a band index for near-duplicate lookups (Hamming distance up to
+    max_distance, colour channels within max_colour_distance) and are persisted
+    to SQLite, so they survive restarts. Each worker loads the entries that
+    exist when it starts; entries other running workers add later are not
+    seen until it restarts. Entries older than ttl seconds are ignored and
+    purged.
+    """
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, max_distance=4, max_colour_distance=24, max_entries=100_000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_distance = min(max_distance, HASH_BANDS - 1)
+        self.max_colour_distance = max_colour_distance
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # ((hash, colour), version, tone, lang) -> (description, created_at), oldest first
+        self._variants = {}            # (hash, colour) -> number of (version, tone, lang) entries
+        self._index = {}               # (band, value) -> set of (hash, colour)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS description_entries ("
+                " image_hash INTEGER NOT NULL,"
+                " colour INTEGER NOT NULL,"
+                " version TEXT NOT NULL,"
+                " tone TEXT NOT NULL,"
+                " lang TEXT NOT NULL,"
+                " description TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (image_hash, colour, version, tone, lang))"
+            )
+            db.execute("DELETE FROM description_entries WHERE created_at < ?", (time.time() - ttl,))
+            rows = db.execute(
+                "SELECT image_hash, colour, version, tone, lang, description, created_at FROM description_entries"
+                " ORDER BY created_at DESC LIMIT ?", (max_entries,)
+            ).fetchall()
+        for image_hash, colour, version, tone, lang, description, created_at in reversed(rows):
+            self._add((image_hash % (1 << 64), colour), version, tone, lang, description, created_at)
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed"""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _add(self, image_key, version, tone, lang, description, created_at):
+        """Insert into the in-memory entries and band index (caller holds the lock or is __init__)"""
+        key = (image_key, version, tone, lang)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            self._variants[image_key] = self._variants.get(image_key, 0) + 1
+        self._entries[key] = (description, created_at)
+        for band in _bands(image_key[0]):
+            self._index.setdefault(band, set()).add(image_key)
+
+    def _remove(self, image_key, version, tone, lang):
+        if self._entries.pop((image_key, version, tone, lang), None) is None:
+            return
+        self._variants[image_key] -= 1
+        if self._variants[image_key]:
+            return
+        del self._variants[image_key]
+        for band in _bands(image_key[0]):
+            keys = self._index.get(band)
+            if keys is not None:
+                keys.discard(image_key)
+                if not keys:
+                    del self._index[band]
+
+    def get(self, key, tone, lang, version=""):
+        """Cached description of the image with this image_key (or a near-identical one), or None"""
+        image_hash, colour = key
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band in _bands(image_hash):
+                candidates |= self._index.get(band, set())
+            best = None
+            for candidate in candidates:
+                distance = bin(candidate[0] ^ image_hash).count("1")
+                colour_off = colour_distance(candidate[1], colour)
+                if distance > self.max_distance or colour_off > self.max_colour_distance:
+                    continue
+                if best is not None and (distance, colour_off) >= best[0]:
+                    continue
+                entry = self._entries.get((candidate, version, tone, lang))
+                if entry is None:
+                    continue
+                if now - entry[1] > self.ttl:
+                    self._remove(candidate, version, tone, lang)
+                    continue
+                best = ((distance, colour_off), entry[0])
+
+            if best is None:
+                self.misses += 1
+                return None
+            if best[0] == (0, 0):
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return best[1]
+
+    def put(self, key, tone, lang, description, version=""):
+        image_hash, colour = key
+        now = time.time()
+        with self._lock:
+            self._add((image_hash, colour), version, tone, lang, description, now)
+            while len(self._entries) > self.max_entries:
+                self._remove(*next(iter(self._entries)))
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO description_entries"
+                " (image_hash, colour, version, tone, lang, description, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_to_signed(image_hash), colour, version, tone, lang, description, now)
+            )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "max_distance": self.max_distance,
+                "max_colour_distance": self.max_colour_distance,
+                "ttl_seconds": self.ttl,
+            }
+
+
+def create_description_cache():
+    """
+    Build the description cache from DESCRIPTION_CACHE_PATH, DESCRIPTION_CACHE_TTL_SECONDS,
+    DESCRIPTION_CACHE_MAX_DISTANCE and DESCRIPTION_CACHE_MAX_COLOUR_DISTANCE.
+
+    Returns None when DESCRIPTION_CACHE is set to 0/false.
+    """
+    if os.getenv("DESCRIPTION_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    db_path = os.getenv(
+        "DESCRIPTION_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "descriptions.sqlite3")
+    )
+    return DescriptionCache(
+        db_path,
+        ttl=float(os.getenv("DESCRIPTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        max_distance=int(os.getenv("DESCRIPTION_CACHE_MAX_DISTANCE", "4")),
+        max_colour_distance=int(os.getenv("DESCRIPTION_CACHE_MAX_COLOUR_DISTANCE", "24")),
+    )
+
+
+description_cache = create_description_cache()
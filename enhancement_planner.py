@@ -0,0 +1,100 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+# "local" plans option 3 with the rule table below, "llm" asks Gemini (memoized)
+OPTION3_PLANNER = os.getenv("OPTION3_PLANNER", "local").lower()
+
+# Number of LLM plans remembered per process
+LLM_PLAN_CACHE_SIZE = int(os.getenv("LLM_PLAN_CACHE_SIZE", "256"))
+
+
+def _interpolate(value, low, high, at_low, at_high):
+    """Linear ramp from at_low (value <= low) to at_high (value >= high)"""
+    if value <= low:
+        return at_low
+    if value >= high:
+        return at_high
+    return at_low + (at_high - at_low) * (value - low) / (high - low)
+
+
+def local_enhancement_plan(analysis: dict) -> dict:
+    """
+    Deterministic enhancement plan from analyze_image features.
+
+    Follows the same rules the LLM prompt spells out, as continuous ramps:
+    dark products get 1.2-1.4 brightness, others 1.0-1.1 or SKIP, contrast is
+    always raised by 1.1-1.3 depending on the dynamic range, small or soft
+    images get more sharpening and noisier images more smoothing.
+    """
+    brightness = analysis['avg_brightness']
+    p95 = analysis.get('p95_brightness', brightness)
+    if brightness < 90:
+        brightness_factor = _interpolate(brightness, 40, 90, 1.4, 1.2)
+    elif brightness < 130:
+        brightness_factor = _interpolate(brightness, 90, 130, 1.1, 1.0)
+    else:
+        brightness_factor = 'SKIP'
+    # Do not push highlights that are already close to clipping
+    if brightness_factor != 'SKIP' and p95 * brightness_factor > 250:
+        brightness_factor = max(1.0, 250 / max(p95, 1))
+        if brightness_factor < 1.01:
+            brightness_factor = 'SKIP'
+
+    contrast_factor = _interpolate(analysis.get('dynamic_range', 150), 100, 200, 1.3, 1.1)
+
+    if analysis['is_small']:
+        smaller_side = min(analysis['width'], analysis['height'])
+        sharpness_factor = _interpolate(smaller_side, 200, 500, 1.8, 1.3)
+    else:
+        sharpness_factor = _interpolate(analysis.get('sharpness', 200), 50, 300, 1.4, 1.1)
+
+    noise_radius = _interpolate(analysis.get('noise_sigma', 2), 2, 6, 0.5, 0.8)
+
+    def rounded(value):
+        return value if value == 'SKIP' else round(value, 2)
+
+    return {
+        'brightness': rounded(brightness_factor),
+        'contrast': rounded(contrast_factor),
+        'sharpness': rounded(sharpness_factor),
+        'noise_reduction': rounded(noise_radius),
+    }
+
+
+def plan_cache_key(analysis: dict) -> tuple:
+    """Quantized analysis features; images that map to the same key share an LLM plan"""
+    return (
+        int(analysis['avg_brightness'] // 10),
+        int(analysis.get('dynamic_range', 0) // 25),
+        bool(analysis['is_small']),
+        round(analysis.get('noise_sigma', 0)),
+        int(math.log2(analysis.get('sharpness', 0) + 1)),
+    )
+
+
+class PlanCache:
+    """Small thread-safe LRU of enhancement plans"""
+
+    def __init__(self, max_entries=LLM_PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+            return dict(plan) if plan is not None else None
+
+    def put(self, key, plan):
+        with self._lock:
+            self._plans[key] = dict(plan)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+
+llm_plan_cache = PlanCache()
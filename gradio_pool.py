@@ -0,0 +1,208 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+import requests
+from resilience import DeadlineExceeded, remaining_budget
+
+# Concurrent calls per Space; match the Space's own concurrency so requests
+# wait here (measured) instead of in the Space's queue
+GRADIO_POOL_SIZE = int(os.getenv("GRADIO_POOL_SIZE", "2"))
+# Per-attempt limit; inside a request budget attempts also end with the budget
+GRADIO_CALL_TIMEOUT = float(os.getenv("GRADIO_CALL_TIMEOUT", "100"))
+GRADIO_RETRIES = int(os.getenv("GRADIO_RETRIES", "2"))
+GRADIO_RETRY_BACKOFF = float(os.getenv("GRADIO_RETRY_BACKOFF", "1.0"))
+# Idle clients older than this are checked against the Space before reuse
+GRADIO_HEALTH_CHECK_SECONDS = float(os.getenv("GRADIO_HEALTH_CHECK_SECONDS", "300"))
+
+# A retry is only started if at least this much of the request budget is left
+# after its backoff
+_MIN_ATTEMPT_SECONDS = 1.0
+
+# Number of recent calls the latency percentiles are computed over
+_METRICS_WINDOW = 200
+
+# Job status codes that mean the Space has started running our request
+_RUNNING_STATUSES = {"PROCESSING", "ITERATING", "PROGRESS", "FINISHED"}
+
+
+class _PooledClient:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+def _summary(values):
+    if not values:
+        return {"mean": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class GradioClientPool:
+    """
+    Long-lived gradio_client connections to one Space.
+
+    Creating a Client fetches the Space config and opens new connections, so
+    clients are kept and reused. At most size calls run at once. A client is
+    health-checked before reuse if it has been idle for a while, and dropped
+    after a failed call. Each attempt has its own timeout. Failed attempts are
+    retried with exponential backoff and jitter. Inside a request budget, no
+    attempt outlives the budget and no retry starts that it could not cover.
+
+    Latency is split into three parts. pool_wait is time waiting here for a
+    free slot. space_queue is time queued inside the Space. inference is the
+    time the Space spent running the request.
+    """
+
+    def __init__(self, space, size=GRADIO_POOL_SIZE, call_timeout=GRADIO_CALL_TIMEOUT,
+                 retries=GRADIO_RETRIES, backoff=GRADIO_RETRY_BACKOFF,
+                 health_check_interval=GRADIO_HEALTH_CHECK_SECONDS):
+        self.space = space
+        self.size = size
+        self.call_timeout = call_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.health_check_interval = health_check_interval
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "attempts": 0, "failures": 0, "timeouts": 0,
+                          "retries": 0, "clients_created": 0, "clients_dropped": 0}
+        self._pool_wait = deque(maxlen=_METRICS_WINDOW)
+        self._space_queue = deque(maxlen=_METRICS_WINDOW)
+        self._inference = deque(maxlen=_METRICS_WINDOW)
+
+    def predict(self, *args, **kwargs):
+        """client.predict(*args, **kwargs) on a pooled client, with timeout and retries"""
+        with self._lock:
+            self._counters["calls"] += 1
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+                budget = remaining_budget()
+                if budget is not None and budget < delay + _MIN_ATTEMPT_SECONDS:
+                    print(f"Not retrying {self.space}: only {budget:.1f}s of the request budget left")
+                    break
+                with self._lock:
+                    self._counters["retries"] += 1
+                print(f"Retrying {self.space} in {delay:.1f}s after: {last_error}")
+                time.sleep(delay)
+            budget = remaining_budget()
+            if budget is not None and budget <= 0:
+                last_error = last_error or DeadlineExceeded(f"No request budget left for {self.space}")
+                break
+            try:
+                return self._attempt(args, kwargs, budget)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _attempt(self, args, kwargs, budget=None):
+        """One call; budget (seconds) bounds the slot wait and the call together"""
+        wait_started = time.monotonic()
+        budget_deadline = wait_started + budget if budget is not None else None
+        if not self._slots.acquire(timeout=budget):
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise DeadlineExceeded(f"No free {self.space} slot within the request budget")
+        pooled = None
+        try:
+            pool_wait = time.monotonic() - wait_started
+            pooled = self._checkout()
+            with self._lock:
+                self._counters["attempts"] += 1
+            submitted = time.monotonic()
+            running_since = None
+
+            job = pooled.client.submit(*args, **kwargs)
+            deadline = submitted + self.call_timeout
+            if budget_deadline is not None:
+                deadline = min(deadline, budget_deadline)
+            while not job.done():
+                if running_since is None and job.status().code.name in _RUNNING_STATUSES:
+                    running_since = time.monotonic()
+                if time.monotonic() >= deadline:
+                    job.cancel()
+                    with self._lock:
+                        self._counters["timeouts"] += 1
+                    raise TimeoutError(f"{self.space} did not answer within {deadline - submitted:.0f}s")
+                time.sleep(0.05)
+            result = job.result(timeout=max(deadline - time.monotonic(), 0))
+
+            finished = time.monotonic()
+            if running_since is None:
+                running_since = submitted
+            with self._lock:
+                self._pool_wait.append(pool_wait)
+                self._space_queue.append(running_since - submitted)
+                self._inference.append(finished - running_since)
+            self._checkin(pooled)
+            return result
+        except Exception:
+            with self._lock:
+                self._counters["failures"] += 1
+            if pooled is not None:
+                self._drop(pooled)
+            raise
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._connect()
+            idle_for = time.monotonic() - pooled.last_used
+            if idle_for < self.health_check_interval or self._healthy(pooled.client):
+                return pooled
+            self._drop(pooled)
+
+    def _checkin(self, pooled):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+
+    def _connect(self):
+        from gradio_client import Client
+
+        client = Client(self.space, verbose=False)
+        with self._lock:
+            self._counters["clients_created"] += 1
+        return _PooledClient(client)
+
+    def _drop(self, pooled):
+        with self._lock:
+            self._counters["clients_dropped"] += 1
+        try:
+            pooled.client.close()
+        except Exception:
+            pass
+
+    def _healthy(self, client):
+        """Cheap liveness probe: the Space still serves its config"""
+        try:
+            response = requests.get(client.src.rstrip("/") + "/config", timeout=5)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "space": self.space,
+                "size": self.size,
+                "idle_clients": len(self._idle),
+                **self._counters,
+                "pool_wait_seconds": _summary(self._pool_wait),
+                "space_queue_seconds": _summary(self._space_queue),
+                "inference_seconds": _summary(self._inference),
+            }
@@ -1,14 +1,17 @@
-import os
 import uuid
 from PIL import Image, ImageEnhance, ImageFilter
-from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
+from image_statistics import compute_image_statistics
+from resilience import external_call
+from ai_clients import chat_model
+from enhancement_planner import OPTION3_PLANNER, local_enhancement_plan, plan_cache_key, llm_plan_cache
 
 load_dotenv()
 
 class image_enhancement_option3_helper:
-    def __init__(self, model):
+    def __init__(self, model, planner=None):
         self.model = model
+        self.planner = planner or OPTION3_PLANNER
     
     def analyze_image(self, img) -> dict:
         """Analyzes an image and returns its properties."""
@@ -16,10 +19,9 @@ class image_enhancement_option3_helper:
             width, height = img.size
             mode = img.mode
             
-            # Simple brightness analysis
-            grayscale = img.convert('L')
-            pixels = list(grayscale.getdata())
-            avg_brightness = sum(pixels) / len(pixels)
+            # Vectorised statistics over the non-transparent (product) pixels
+            stats = compute_image_statistics(img)
+            avg_brightness = stats['mean_brightness']
             
             analysis = {
                 'width': width,
@@ -29,19 +31,29 @@ class image_enhancement_option3_helper:
                 'is_dark': avg_brightness < 100,
                 'is_small': width < 500 or height < 500,
                 'aspect_ratio': width / height,
-                'recommendations': []
+                'recommendations': [],
+                **stats
             }
             
             # Generate recommendations
             if analysis['is_dark']:
                 analysis['recommendations'].append(f"Increase brightness (current: {avg_brightness:.1f})")
             
-            analysis['recommendations'].append("Enhance contrast for better dynamic range")
+            if stats['dynamic_range'] < 150:
+                analysis['recommendations'].append(
+                    f"Enhance contrast for better dynamic range (current range: {stats['dynamic_range']:.0f})")
+            else:
+                analysis['recommendations'].append("Enhance contrast slightly, dynamic range is already wide")
             
             if analysis['is_small']:
                 analysis['recommendations'].append("Apply sharpening (small image)")
+            elif stats['sharpness'] < 100:
+                analysis['recommendations'].append(f"Apply sharpening (soft image, sharpness: {stats['sharpness']:.0f})")
             
-            analysis['recommendations'].append("Light noise reduction for smoothing")
+            if stats['noise_sigma'] > 3:
+                analysis['recommendations'].append(f"Noise reduction (noise sigma: {stats['noise_sigma']:.1f})")
+            else:
+                analysis['recommendations'].append("Light noise reduction for smoothing")
             return analysis
                 
         except Exception as e:
@@ -50,21 +62,37 @@ class image_enhancement_option3_helper:
 
     def ai_enhanced_image_processing(self, image: Image) -> str:
         """
-        Uses AI to analyze the image and decide on enhancements, then applies them.
-        This is a hybrid approach that uses AI for decision making but direct Python for processing.
+        Analyzes the image, decides on enhancements and applies them.
+        The decision comes from the local rule table by default (OPTION3_PLANNER=local)
+        or from Gemini (OPTION3_PLANNER=llm), with direct Python for processing either way.
         """
         # Step 1: Analyze the image
         analysis = self.analyze_image(image)
         if not analysis:
             return None
         
-        
-        # Step 2: Using Google Generative AI to decide on enhancements
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=os.getenv("SECRET_API_KEY"),
-            temperature=0.1,
-        )
+        # Step 2: Decide on enhancements
+        try:
+            if self.planner == "llm":
+                enhancement_plan = self.llm_enhancement_plan(analysis)
+            else:
+                enhancement_plan = local_enhancement_plan(analysis)
+            print(f"Enhancement plan ({self.planner}): {enhancement_plan}")
+            return self.apply_enhancement_plan(image, enhancement_plan)
+            
+        except Exception as e:
+            print(f"Enhancement planning failed, using rules: {e}")
+            return self.rule_based_enhancement(image, analysis)
+
+    def llm_enhancement_plan(self, analysis: dict) -> dict:
+        """Ask Gemini for an enhancement plan, memoized by quantized analysis features"""
+        cache_key = plan_cache_key(analysis)
+        cached_plan = llm_plan_cache.get(cache_key)
+        if cached_plan is not None:
+            return cached_plan
+
+        # Using Google Generative AI to decide on enhancements
+        llm = chat_model("gemini-2.5-flash", temperature=0.1)
         
         ai_prompt = f"""
         You are an expert image enhancement specialist. Based on this image analysis, decide on the optimal enhancement strategy:
@@ -76,6 +104,11 @@ class image_enhancement_option3_helper:
         - Is dark: {analysis['is_dark']}
         - Is small: {analysis['is_small']}
         - Aspect ratio: {analysis['aspect_ratio']:.2f}
+        - Brightness 5th/50th/95th percentile: {analysis['p5_brightness']:.0f}/{analysis['median_brightness']:.0f}/{analysis['p95_brightness']:.0f}
+        - Brightness standard deviation: {analysis['std_brightness']:.1f}
+        - Noise sigma: {analysis['noise_sigma']:.2f}
+        - Sharpness (Laplacian variance): {analysis['sharpness']:.0f}
+        - Product coverage of the frame: {analysis['foreground_coverage']:.0%}
 
         Recommendations from analysis:
         {chr(10).join(f"- {rec}" for rec in analysis['recommendations'])}
@@ -94,31 +127,33 @@ class image_enhancement_option3_helper:
         - Use light noise reduction (0.5-0.8) for final smoothing
         """
         
-        try:
-            ai_response = llm.invoke(ai_prompt)
-            print(f"AI Enhancement Plan:\n{ai_response.content}")
-            
-            enhancement_plan = self.parse_ai_response(ai_response.content)
-                    
-            if enhancement_plan.get('brightness') != 'SKIP':
-                print(f"Applying brightness enhancement (factor: {enhancement_plan['brightness']})")
-                current_image = self.increase_brightness(image, enhancement_plan['brightness'])
-
-            if enhancement_plan.get('contrast') != 'SKIP':
-                print(f"Applying contrast enhancement (factor: {enhancement_plan['contrast']})")
-                current_image = self.increase_contrast(current_image, enhancement_plan['contrast'])
-
-            if enhancement_plan.get('sharpness') != 'SKIP':
-                print(f"Applying sharpness enhancement (factor: {enhancement_plan['sharpness']})")
-                current_image = self.increase_sharpness(current_image, enhancement_plan['sharpness'])
-
-            if enhancement_plan.get('noise_reduction') != 'SKIP':
-                print(f"Applying noise reduction (radius: {enhancement_plan['noise_reduction']})")
-                current_image = self.noise_reduction(current_image, enhancement_plan['noise_reduction'])
-            return current_image 
-            
-        except Exception as e:
-            return self.rule_based_enhancement(image, analysis)
+        ai_response = external_call("gemini_option3", llm.invoke, ai_prompt)
+        print(f"AI Enhancement Plan:\n{ai_response.content}")
+        
+        enhancement_plan = self.parse_ai_response(ai_response.content)
+        llm_plan_cache.put(cache_key, enhancement_plan)
+        return enhancement_plan
+
+    def apply_enhancement_plan(self, image, enhancement_plan: dict):
+        """Apply brightness, contrast, sharpness and noise reduction steps of a plan"""
+        current_image = image
+
+        if enhancement_plan.get('brightness') != 'SKIP':
+            print(f"Applying brightness enhancement (factor: {enhancement_plan['brightness']})")
+            current_image = self.increase_brightness(current_image, enhancement_plan['brightness'])
+
+        if enhancement_plan.get('contrast') != 'SKIP':
+            print(f"Applying contrast enhancement (factor: {enhancement_plan['contrast']})")
+            current_image = self.increase_contrast(current_image, enhancement_plan['contrast'])
+
+        if enhancement_plan.get('sharpness') != 'SKIP':
+            print(f"Applying sharpness enhancement (factor: {enhancement_plan['sharpness']})")
+            current_image = self.increase_sharpness(current_image, enhancement_plan['sharpness'])
+
+        if enhancement_plan.get('noise_reduction') != 'SKIP':
+            print(f"Applying noise reduction (radius: {enhancement_plan['noise_reduction']})")
+            current_image = self.noise_reduction(current_image, enhancement_plan['noise_reduction'])
+        return current_image 
 
     def parse_ai_response(self,response: str) -> dict:
         """Parse the AI response to extract enhancement parameters."""
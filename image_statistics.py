@@ -0,0 +1,85 @@
+import math
+import cv2
+import numpy as np
+
+# Alpha at or below this value counts as background
+ALPHA_THRESHOLD = 8
+
+# The robust noise estimate is taken on at most this many Laplacian samples
+NOISE_SAMPLE_SIZE = 250_000
+
+_CROSS_KERNEL = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+
+
+def _percentile_from_histogram(cumulative, fraction):
+    return float(np.searchsorted(cumulative, fraction * cumulative[-1]))
+
+
+def compute_image_statistics(img, histogram_bins=16):
+    """
+    Vectorised brightness, contrast, noise and sharpness statistics of a PIL image.
+
+    Pixels that are (nearly) transparent are left out, so the cut-out product
+    is measured rather than the removed background. Brightness statistics come
+    from a 256-bin histogram, so no per-pixel sort is needed. Noise is a robust
+    estimate of the Laplacian residual's standard deviation (on a strided
+    sample) and sharpness is the Laplacian variance, both over the interior of
+    the product area.
+    """
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or img.mode == "P" else "RGB")
+    array = np.asarray(img)
+
+    mask = None
+    coverage = 1.0
+    if array.shape[-1] == 4:
+        gray = cv2.cvtColor(array, cv2.COLOR_RGBA2GRAY)
+        mask = (array[..., 3] > ALPHA_THRESHOLD).astype(np.uint8)
+        coverage = float(cv2.countNonZero(mask)) / mask.size
+        # Without any opaque pixel, measure the whole image instead
+        if not mask.any():
+            mask = None
+    else:
+        gray = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+
+    counts = cv2.calcHist([gray], [0], mask, [256], [0, 256]).ravel().astype(np.float64)
+    total = max(counts.sum(), 1.0)
+    levels = np.arange(256, dtype=np.float64)
+    mean = float((counts * levels).sum() / total)
+    std = float(np.sqrt((counts * (levels - mean) ** 2).sum() / total))
+    cumulative = np.cumsum(counts)
+    p5 = _percentile_from_histogram(cumulative, 0.05)
+    p50 = _percentile_from_histogram(cumulative, 0.50)
+    p95 = _percentile_from_histogram(cumulative, 0.95)
+    histogram = counts.reshape(histogram_bins, -1).sum(axis=1) / total
+
+    # ksize=1 is the 4-neighbour Laplacian; the product edge against the removed
+    # background is excluded by eroding the mask
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F, ksize=1)
+    inner = cv2.erode(mask, _CROSS_KERNEL) if mask is not None else None
+    if inner is not None and not inner.any():
+        inner = None
+    _, stddev = cv2.meanStdDev(laplacian, mask=inner)
+    sharpness = float(stddev[0, 0] ** 2)
+
+    step = max(1, math.ceil(math.sqrt(laplacian.size / NOISE_SAMPLE_SIZE)))
+    sample = laplacian[::step, ::step]
+    if inner is not None:
+        sample = sample[inner[::step, ::step] > 0]
+    sample = sample.ravel()
+    # Median absolute deviation scaled to a standard deviation; the 1/sqrt(20)
+    # factor normalises the Laplacian kernel's gain on white noise
+    noise = float(np.median(np.abs(sample - np.median(sample))) * 1.4826 / math.sqrt(20.0)) if sample.size else 0.0
+
+    return {
+        "mean_brightness": mean,
+        "std_brightness": std,
+        "p5_brightness": p5,
+        "median_brightness": p50,
+        "p95_brightness": p95,
+        "dynamic_range": p95 - p5,
+        "histogram": [round(float(v), 4) for v in histogram],
+        "foreground_coverage": round(coverage, 4),
+        "noise_sigma": noise,
+        "sharpness": sharpness,
+    }
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """Raised when the queue already holds its maximum number of pending jobs"""
+
+
+class Job:
+    """A unit of background work with per-stage progress"""
+
+    def __init__(self, job_id, kind, stages):
+        self.id = job_id
+        self.kind = kind
+        self.status = "queued"
+        self.stages = {stage: "pending" for stage in stages}
+        self.current_stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update_stage(self, stage, status):
+        """Progress callback handed to the job function: update_stage("detect_objects", "running")"""
+        with self._lock:
+            self.stages[stage] = status
+            if status == "running":
+                self.current_stage = stage
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed")
+
+    def to_dict(self, include_result=True):
+        with self._lock:
+            stages = dict(self.stages)
+        done = sum(1 for status in stages.values() if status in ("completed", "cached", "failed", "skipped"))
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "current_stage": self.current_stage,
+            "stages": stages,
+            "progress": round(done / len(stages), 3) if stages else (1.0 if self.finished else 0.0),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if include_result and self.status == "completed":
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """
+    Bounded worker pool for long-running pipeline work.
+
+    At most max_workers jobs run at once and at most max_queue_depth more wait
+    for a worker; submit() raises JobQueueFull beyond that so the API can push
+    back instead of piling up work. Finished jobs are kept for job_ttl seconds
+    so clients can poll for the result.
+    """
+
+    def __init__(self, max_workers=2, max_queue_depth=16, job_ttl=3600):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, stages=(), **kwargs):
+        """
+        Queue fn(*args, progress=job.update_stage, **kwargs) and return the Job.
+
+        The return value of fn becomes job.result.
+        """
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_workers + self.max_queue_depth:
+                raise JobQueueFull(f"Job queue is full ({self._pending} pending jobs)")
+            job = Job(str(uuid.uuid4()), kind, stages)
+            self._jobs[job.id] = job
+            self._pending += 1
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "pending": self._pending,
+                "jobs": counts,
+            }
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, progress=job.update_stage, **kwargs)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            traceback.print_exc()
+            job.error = str(e)
+            if job.current_stage is not None and job.stages.get(job.current_stage) == "running":
+                job.update_stage(job.current_stage, "failed")
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def _prune(self):
+        """Forget finished jobs older than job_ttl (caller holds the lock)"""
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def create_job_queue(prefix="JOB", max_workers=2, max_queue_depth=16):
+    """
+    Build a job queue from {prefix}_WORKERS, {prefix}_QUEUE_DEPTH and {prefix}_TTL_SECONDS.
+
+    max_workers and max_queue_depth are the defaults when the variables are unset.
+    """
+    return JobQueue(
+        max_workers=int(os.getenv(f"{prefix}_WORKERS", str(max_workers))),
+        max_queue_depth=int(os.getenv(f"{prefix}_QUEUE_DEPTH", str(max_queue_depth))),
+        job_ttl=int(os.getenv(f"{prefix}_TTL_SECONDS", "3600")),
+    )
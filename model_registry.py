@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # resource is not available on Windows
+    resource = None
+
+
+def _current_rss_bytes():
+    """Best effort resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+def _parameter_bytes(model):
+    """Size of the weights of a torch module (or tuple containing modules)"""
+    if isinstance(model, (tuple, list)):
+        return sum(_parameter_bytes(m) for m in model)
+    parameters = getattr(model, "parameters", None)
+    if parameters is None:
+        return 0
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of local models.
+
+    Models are registered with a loader callable and are loaded lazily on the
+    first get() (or eagerly with warm_up()). Each model is loaded exactly once
+    per worker process and then shared by all requests.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Register a loader callable for a model name"""
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """Return the loaded model, loading it on first use"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Model '{name}' is not registered")
+
+        # One lock per model so loading the detector does not block rembg
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            print(f"Loading model '{name}'...")
+            rss_before = _current_rss_bytes()
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            load_time = time.perf_counter() - start
+            rss_after = _current_rss_bytes()
+
+            weights = _parameter_bytes(model)
+            self._stats[name] = {
+                "load_time_seconds": round(load_time, 3),
+                "memory_bytes": weights or max(rss_after - rss_before, 0),
+                "loaded_at": time.time(),
+            }
+            self._models[name] = model
+            print(f"Model '{name}' loaded in {load_time:.2f}s")
+            return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        """Eagerly load the given models (all registered models by default)"""
+        names = list(self._loaders) if names is None else names
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Warm-up failed for model '{name}': {e}")
+
+    def stats(self):
+        """Load time and memory per registered model"""
+        return {
+            name: {"loaded": name in self._models, **self._stats.get(name, {})}
+            for name in self._loaders
+        }
+
+
+# Shared by every module in this worker process
+model_registry = ModelRegistry()
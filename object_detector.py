@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import torch
+from transformers import OwlViTProcessor, OwlViTForObjectDetection
+from transformers.models.owlvit.modeling_owlvit import OwlViTObjectDetectionOutput
+
+DETECTION_MODEL_NAME = "google/owlvit-base-patch32"
+
+# Precomputed text query embeddings are stored here, keyed by model revision + vocabulary hash
+DETECTION_CACHE_DIR = os.getenv(
+    "DETECTION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "detection")
+)
+
+# Largest number of images stacked into one forward pass
+DETECTION_MAX_BATCH_SIZE = int(os.getenv("DETECTION_MAX_BATCH_SIZE", "8"))
+
+DETECTION_TEXTS = [
+    # Giyim
+    "clothing",
+    "topwear",
+    "bottomwear",
+    "outerwear",
+    "apparel",
+    "sportswear",
+    "uniform",
+    "underwear",
+    "dress",
+    "outfit",
+
+    # Ayakkabı
+    "footwear",
+    "shoes",
+    "boots",
+    "sneakers",
+
+    # Aksesuarlar
+    "accessory",
+    "bag",
+    "backpack",
+    "handbag",
+    "wallet",
+    "belt",
+    "hat",
+    "cap",
+    "scarf",
+    "glasses",
+    "watch",
+    "jewelry",
+
+    # Elektronik
+    "electronics",
+    "device",
+    "gadget",
+    "smartphone",
+    "laptop",
+    "tablet",
+    "headphones",
+    "smartwatch",
+
+    # Kozmetik / Kişisel Bakım
+    "cosmetics",
+    "beauty product",
+    "skincare",
+    "makeup",
+    "perfume",
+    "hair product",
+
+    # Bebek ve çocuk
+    "baby product",
+    "baby clothes",
+    "toy",
+    "stroller",
+    "pacifier",
+
+    # Ev ve yaşam
+    "home item",
+    "furniture",
+    "appliance",
+    "decor",
+    "kitchenware",
+    "bedding",
+    "cleaning tool",
+
+    # Spor ve outdoor
+    "sports gear",
+    "fitness equipment",
+    "gym accessory",
+    "camping gear",
+    "bicycle equipment"
+]
+
+
+class ObjectDetector:
+    """
+    OWL-ViT detector with a fixed text vocabulary.
+
+    The text tower only depends on the vocabulary, so the query embeddings are
+    computed once (or loaded from disk) and every detection call only runs the
+    image tower and the box/class heads.
+    """
+
+    def __init__(self, processor, model, texts=DETECTION_TEXTS, cache_dir=DETECTION_CACHE_DIR):
+        self.processor = processor
+        self.model = model
+        self.texts = list(texts)
+        self.cache_dir = cache_dir
+        # Fast tokenizers are not safe to call from several threads at once
+        self._processor_lock = threading.Lock()
+        self.query_embeds, self.query_mask = self._load_query_embeddings()
+
+    def _cache_path(self):
+        revision = getattr(self.model.config, "_commit_hash", None) or self.model.config._name_or_path
+        vocabulary_hash = hashlib.sha256(json.dumps(self.texts).encode("utf-8")).hexdigest()
+        key = hashlib.sha256(f"{revision}:{vocabulary_hash}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"owlvit_text_queries_{key}.pt")
+
+    def _load_query_embeddings(self):
+        cache_path = self._cache_path()
+        if os.path.exists(cache_path):
+            try:
+                cached = torch.load(cache_path, map_location="cpu")
+                print(f"Loaded detection text embeddings from {cache_path}")
+                return cached["query_embeds"], cached["query_mask"]
+            except Exception as e:
+                print(f"Ignoring unreadable text embedding cache {cache_path}: {e}")
+
+        query_embeds, query_mask = self._compute_query_embeddings()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            torch.save({"query_embeds": query_embeds, "query_mask": query_mask}, temp_path)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache detection text embeddings: {e}")
+        return query_embeds, query_mask
+
+    def _compute_query_embeddings(self):
+        with self._processor_lock:
+            text_inputs = self.processor(text=[self.texts], return_tensors="pt")
+
+        input_ids = text_inputs["input_ids"]
+        with torch.no_grad():
+            text_embeds = self.model.owlvit.get_text_features(
+                input_ids=input_ids,
+                attention_mask=text_inputs["attention_mask"]
+            )
+        # Same normalisation OwlViTModel applies before the class head
+        text_embeds = text_embeds / torch.linalg.norm(text_embeds, ord=2, dim=-1, keepdim=True)
+
+        query_embeds = text_embeds.reshape(1, len(self.texts), text_embeds.shape[-1])
+        query_mask = input_ids.reshape(1, len(self.texts), input_ids.shape[-1])[..., 0] > 0
+        return query_embeds, query_mask
+
+    def detect(self, image, threshold=0.2):
+        """Run detection on a single PIL image and return post-processed results"""
+        return self.detect_batch([image], threshold=threshold)[0]
+
+    def detect_batch(self, images, threshold=0.2, max_batch_size=None):
+        """
+        Run detection on a list of PIL images.
+
+        Images are stacked into forward passes of at most max_batch_size images
+        (never more than DETECTION_MAX_BATCH_SIZE) and one post-processed result
+        dict is returned per image, in order.
+        """
+        # Callers may ask for smaller passes, never larger than the configured limit
+        max_batch_size = max(1, min(max_batch_size or DETECTION_MAX_BATCH_SIZE, DETECTION_MAX_BATCH_SIZE))
+        results = []
+        for start in range(0, len(images), max_batch_size):
+            results.extend(self._detect_chunk(images[start:start + max_batch_size], threshold))
+        return results
+
+    def _detect_chunk(self, images, threshold):
+        with self._processor_lock:
+            pixel_values = self.processor(images=images, return_tensors="pt")["pixel_values"]
+
+        with torch.no_grad():
+            feature_map = self.model.image_embedder(pixel_values=pixel_values)[0]
+            batch_size, height, width, hidden_dim = feature_map.shape
+            image_feats = feature_map.reshape(batch_size, height * width, hidden_dim)
+
+            query_embeds = self.query_embeds.expand(batch_size, -1, -1)
+            query_mask = self.query_mask.expand(batch_size, -1)
+            pred_logits, _ = self.model.class_predictor(image_feats, query_embeds, query_mask)
+            pred_boxes = self.model.box_predictor(image_feats, feature_map)
+
+        outputs = OwlViTObjectDetectionOutput(logits=pred_logits, pred_boxes=pred_boxes)
+        target_sizes = torch.tensor([image.size[::-1] for image in images])
+        return self.processor.post_process_grounded_object_detection(
+            outputs=outputs,
+            target_sizes=target_sizes,
+            threshold=threshold
+        )
+
+def load_object_detector():
+    processor = OwlViTProcessor.from_pretrained(DETECTION_MODEL_NAME)
+    model = OwlViTForObjectDetection.from_pretrained(DETECTION_MODEL_NAME)
+    model.eval()
+    return ObjectDetector(processor, model)
@@ -0,0 +1,123 @@
+import base64
+import os
+import threading
+import time
+from io import BytesIO
+from PIL import Image
+
+
+class PayloadPolicy:
+    """How images are prepared for one external destination"""
+
+    def __init__(self, max_side, image_format, quality=None, flatten=False, compress_level=None):
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        # Paste transparent images on white (formats or models without alpha)
+        self.flatten = flatten
+        self.compress_level = compress_level
+
+
+# Gemini downsamples images to at most 768 px tiles, so larger uploads only cost
+# bandwidth; the finegrain Space gets a lossless PNG (fast compression) capped
+# in size, since it upscales whatever it receives by UPSCALE_FACTOR
+PAYLOAD_POLICIES = {
+    "gemini_description": PayloadPolicy(
+        max_side=int(os.getenv("DESCRIPTION_MAX_SIDE", "768")),
+        image_format="JPEG",
+        quality=int(os.getenv("DESCRIPTION_JPEG_QUALITY", "85")),
+        flatten=True,
+    ),
+    "finegrain": PayloadPolicy(
+        max_side=int(os.getenv("FINEGRAIN_MAX_SIDE", "1024")),
+        image_format="PNG",
+        compress_level=1,
+    ),
+}
+
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+class Payload:
+    """An encoded image ready to send"""
+
+    def __init__(self, data, mime_type, size):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+
+    @property
+    def b64(self):
+        return base64.b64encode(self.data).decode()
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(destination, **values):
+    with _stats_lock:
+        entry = _stats.setdefault(destination, {
+            "payloads": 0, "calls": 0, "bytes_sent": 0,
+            "pixels_in": 0, "pixels_out": 0, "encode_seconds": 0.0,
+        })
+        for key, value in values.items():
+            entry[key] += value
+
+
+def prepare_payload(destination, image):
+    """
+    Resize and encode an image according to the destination's policy.
+
+    Images are only ever scaled down (Lanczos), keeping the aspect ratio.
+    """
+    policy = PAYLOAD_POLICIES[destination]
+    started = time.perf_counter()
+    pixels_in = image.width * image.height
+
+    # Downsize first so flattening and encoding only touch the pixels that are sent
+    if max(image.size) > policy.max_side:
+        scale = policy.max_side / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        # reducing_gap box-reduces by an integer factor before the Lanczos pass
+        image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if policy.flatten and "A" in image.getbands():
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])  # Use alpha channel as mask
+        image = background
+    if policy.image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    options = {}
+    if policy.quality is not None:
+        options["quality"] = policy.quality
+    if policy.compress_level is not None:
+        options["compress_level"] = policy.compress_level
+    buffer = BytesIO()
+    image.save(buffer, format=policy.image_format, **options)
+
+    _record(destination, payloads=1, pixels_in=pixels_in, pixels_out=image.width * image.height,
+            encode_seconds=time.perf_counter() - started)
+    return Payload(buffer.getvalue(), MIME_TYPES[policy.image_format], image.size)
+
+
+def payload_mime_type(destination):
+    return MIME_TYPES[PAYLOAD_POLICIES[destination].image_format]
+
+
+def record_sent(destination, nbytes):
+    """Count one outbound call carrying nbytes of image data"""
+    _record(destination, calls=1, bytes_sent=nbytes)
+
+
+def payload_stats():
+    with _stats_lock:
+        return {
+            destination: {
+                **entry,
+                "encode_seconds": round(entry["encode_seconds"], 3),
+                "mean_bytes_per_call": round(entry["bytes_sent"] / entry["calls"]) if entry["calls"] else None,
+            }
+            for destination, entry in _stats.items()
+        }
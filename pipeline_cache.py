@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from PIL import Image
+
+
+class PipelineCache:
+    """
+    Content-addressed on-disk cache for pipeline stage outputs.
+
+    Entries are addressed by a key derived from the input bytes and pipeline
+    parameters plus a stage name, and hold JSON metadata and PNG images under
+    directory/<key[:2]>/<key>/<stage>/. When the cache grows beyond max_bytes the
+    least recently used stage entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, _, size in self._scan())
+
+    @staticmethod
+    def key(*parts):
+        """
+        Hash parts (in order) into a cache key.
+
+        bytes are hashed as they are, str as UTF-8 and None as empty; anything
+        else (numbers, tuples) by its repr, so settings can be passed unconverted.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if part is None:
+                part = b""
+            elif isinstance(part, str):
+                part = part.encode("utf-8")
+            elif not isinstance(part, bytes):
+                part = repr(part).encode("utf-8")
+            digest.update(hashlib.sha256(part).digest())
+        return digest.hexdigest()
+
+    def _entry_dir(self, key, stage):
+        return os.path.join(self.directory, key[:2], key, stage)
+
+    def get(self, key, stage):
+        """Return (metadata, images) for a cached stage, or None"""
+        entry_dir = self._entry_dir(key, stage)
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as f:
+                metadata = json.load(f)
+            images = {}
+            for name in metadata.get("images", []):
+                with Image.open(os.path.join(entry_dir, f"{name}.png")) as image:
+                    image.load()
+                    images[name] = image
+            os.utime(entry_dir)  # mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+        return metadata.get("data", {}), images
+
+    def put(self, key, stage, data, images=None):
+        """Store JSON-serialisable data and PIL images for a stage"""
+        images = images or {}
+        entry_dir = self._entry_dir(key, stage)
+        temp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+            for name, image in images.items():
+                image.save(os.path.join(temp_dir, f"{name}.png"), format="PNG", compress_level=1)
+            with open(os.path.join(temp_dir, "meta.json"), "w") as f:
+                json.dump({"data": data, "images": sorted(images), "created_at": time.time()}, f)
+
+            size = self._dir_size(temp_dir)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+        except OSError as e:
+            print(f"Could not write pipeline cache entry {key[:12]}/{stage}: {e}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._bytes += size
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+    def _scan(self):
+        """Yield (last_used, entry_dir, size) for every stage entry on disk"""
+        for prefix in self._listdir(self.directory):
+            prefix_dir = os.path.join(self.directory, prefix)
+            for key in self._listdir(prefix_dir):
+                key_dir = os.path.join(prefix_dir, key)
+                for stage in self._listdir(key_dir):
+                    entry_dir = os.path.join(key_dir, stage)
+                    if stage.endswith(".tmp"):
+                        continue
+                    try:
+                        yield os.path.getmtime(entry_dir), entry_dir, self._dir_size(entry_dir)
+                    except OSError:
+                        continue
+
+    @staticmethod
+    def _listdir(path):
+        # Other workers may remove entries while we scan
+        try:
+            return os.listdir(path) if os.path.isdir(path) else []
+        except OSError:
+            return []
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is below 90% of its budget"""
+        with self._lock:
+            entries = sorted(self._scan())
+            total = sum(size for _, _, size in entries)
+            target = self.max_bytes * 0.9
+            for _, entry_dir, size in entries:
+                if total <= target:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                self._evictions += 1
+                key_dir = os.path.dirname(entry_dir)
+                if not self._listdir(key_dir):
+                    shutil.rmtree(key_dir, ignore_errors=True)
+            self._bytes = total
+
+
+def create_pipeline_cache():
+    """
+    Build the pipeline cache from PIPELINE_CACHE_DIR and PIPELINE_CACHE_MAX_MB.
+
+    Returns None when PIPELINE_CACHE is set to 0/false.
+    """
+    if os.getenv("PIPELINE_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    directory = os.getenv(
+        "PIPELINE_CACHE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "pipeline")
+    )
+    max_bytes = int(float(os.getenv("PIPELINE_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+    return PipelineCache(directory, max_bytes=max_bytes)
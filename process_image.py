@@ -1,283 +1,427 @@
-from transformers import OwlViTProcessor, OwlViTForObjectDetection
 from PIL import Image
-import torch
-from rembg import remove
 import os
-import cv2
-import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
-from gradio_client import Client, handle_file
 import json
-import google.generativeai as genai
-import base64
+import time
+from io import BytesIO
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import image_enhancement_option3_helper
 from dotenv import load_dotenv
+from model_registry import model_registry
+from object_detector import DETECTION_TEXTS, load_object_detector
+from segmentation import cutout_with_mask, load_segmenter
+from option1_engine import enhance_option1
+from upscalers import load_upscaler
+from resilience import external_call, remaining_budget
+from ai_clients import gemini_model
+from payloads import payload_mime_type, prepare_payload, record_sent
+from description_cache import description_cache, image_key
 
 load_dotenv()
 
+model_registry.register("owlvit", load_object_detector)
+model_registry.register("rembg", load_segmenter)
+model_registry.register("upscaler", load_upscaler)
+
+# Per-option time limits (seconds) for enhance_all_options
+OPTION_TIMEOUTS = {
+    1: float(os.getenv("OPTION1_TIMEOUT_SECONDS", "30")),
+    2: float(os.getenv("OPTION2_TIMEOUT_SECONDS", "120")),
+    3: float(os.getenv("OPTION3_TIMEOUT_SECONDS", "45")),
+}
+
+DESCRIPTION_MODEL = "gemini-2.0-flash-exp"
+# Bump when description_prompt changes; cached descriptions are kept per model and prompt version
+DESCRIPTION_PROMPT_VERSION = "1"
+DESCRIPTION_CACHE_VERSION = f"{DESCRIPTION_MODEL}/{DESCRIPTION_PROMPT_VERSION}"
+# Description images are downsized and encoded by the "gemini_description" payload policy
+DESCRIPTION_MIME_TYPE = payload_mime_type("gemini_description")
+# Batch descriptions: images per multi-image prompt and prompts in flight
+DESCRIPTION_BATCH_SIZE = int(os.getenv("DESCRIPTION_BATCH_SIZE", "4"))
+DESCRIPTION_CONCURRENCY = int(os.getenv("DESCRIPTION_CONCURRENCY", "4"))
+
+# Shared by all requests; PIL filters and OpenCV release the GIL, so the CPU
+# bound option 1 runs in parallel with the network bound options 2 and 3
+_option_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OPTION_WORKERS", "6")),
+    thread_name_prefix="enhance-option"
+)
+
+
+def select_crop_box(results):
+    """
+    Decide which region of the image holds the product.
+
+    Returns the detected label ids and the crop box (xmin, ymin, xmax, ymax),
+    or None when the whole image should be kept.
+    """
+    detected_objects = results["labels"].tolist()
+
+    # Collect all valid bounding boxes
+    valid_boxes = []
+    detected_labels = []
+    for score, label_id, box in zip(results["scores"], results["labels"], results["boxes"]):
+        if score < 0.05:
+            continue 
+        valid_boxes.append(box.tolist())
+        detected_labels.append(DETECTION_TEXTS[label_id])
+    
+    if len(valid_boxes) == 0:
+        return detected_objects, None
+    elif len(valid_boxes) == 1:
+        # Single object detected
+        print(f"Single object detected: {detected_labels[0]}")
+        return detected_objects, tuple(map(int, valid_boxes[0]))
+    else:
+        # Multiple objects detected and they are pairs      
+        similar_items = ['shoes', 'boots', 'sneakers', 'footwear', 'glasses', 'earrings', 
+                       'gloves', 'socks', 'jewelry', 'watch', 'bracelet']
+        clothing_items = ['clothing', 'topwear', 'bottomwear', 'dress', 'outfit', 'apparel']
+        
+        has_similar_items = any(any(item in label.lower() for item in similar_items) 
+                              for label in detected_labels)
+        has_clothing_items = any(any(item in label.lower() for item in clothing_items) 
+                               for label in detected_labels)
+        
+        if has_similar_items or has_clothing_items or len(valid_boxes) <= 3:
+            # Combining them
+            all_xmin = min(box[0] for box in valid_boxes)
+            all_ymin = min(box[1] for box in valid_boxes)
+            all_xmax = max(box[2] for box in valid_boxes)
+            all_ymax = max(box[3] for box in valid_boxes)
+        
+            return detected_objects, (all_xmin, all_ymin, all_xmax, all_ymax)
+        else: # If there are too many different objects
+            return detected_objects, None
+
+
+def crop_to_box(image, box):
+    """Crop an image to a box returned by select_crop_box (None keeps the whole image)"""
+    if box is None:
+        return image
+    return image.crop(box)
+
+
+def detect_objects_batch(images, max_batch_size=None):
+    """
+    Detect and crop the product in many images with batched forward passes.
+
+    Returns one dict per image with the detected label ids, names, crop box and
+    cropped image.
+    """
+    detector = model_registry.get("owlvit")
+    batch_results = detector.detect_batch(images, threshold=0.2, max_batch_size=max_batch_size)
+
+    detections = []
+    for image, results in zip(images, batch_results):
+        detected_objects, crop_box = select_crop_box(results)
+        detections.append({
+            "detected_objects": detected_objects,
+            "labels": [DETECTION_TEXTS[label_id] for label_id in detected_objects],
+            "crop_box": [float(v) for v in crop_box] if crop_box is not None else None,
+            "cropped_image": crop_to_box(image, crop_box)
+        })
+    return detections
+
+def description_image_b64(image):
+    """Base64 image for a description prompt, prepared by the gemini_description payload policy"""
+    return prepare_payload("gemini_description", image).b64
+
+
+def description_prompt(tone="professional", lang="en", count=1):
+    """Listing prompt for one image, or for count images answered as a JSON array"""
+    keys = (
+        "'title', 'description', 'features', 'tags'. "
+        "The 'features' and 'tags' must be arrays of strings. "
+    )
+    if count == 1:
+        return (
+            f"Analyze this product image and generate an SEO-optimized e-commerce product listing in {lang}. "
+            f"Tone: {tone}. Respond ONLY with valid JSON (no markdown formatting) containing these exact keys: "
+            f"{keys}"
+            f"Do not include any other text or formatting."
+        )
+    return (
+        f"You are given {count} product images, each labelled 'Image N'. For each image, generate an "
+        f"SEO-optimized e-commerce product listing in {lang}. Tone: {tone}. Describe every image on its own. "
+        f"Respond ONLY with a valid JSON array (no markdown formatting) of exactly {count} objects, in image "
+        f"order, each containing these exact keys: {keys}"
+        f"Do not include any other text or formatting."
+    )
+
+
+def is_description_error(description):
+    """True for the error messages describe_image_b64 returns instead of a listing"""
+    return description.startswith(("Error generating description", "Invalid JSON response"))
+
+
+def strip_code_fences(text):
+    """Remove the markdown code block Gemini sometimes wraps JSON in"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]  # Remove ```json
+    if text.startswith("```"):
+        text = text[3:]   # Remove ```
+    if text.endswith("```"):
+        text = text[:-3]  # Remove trailing ```
+    return text.strip()
+
+
+def describe_image_b64(image_b64, tone="professional", lang="en"):
+    """Listing JSON text for one base64 image, or an error message (see is_description_error)"""
+    # Configured once per process and shared by all requests
+    model = gemini_model(DESCRIPTION_MODEL)
+    prompt = description_prompt(tone, lang)
+
+    try:
+        response = external_call(
+            "gemini_description",
+            model.generate_content,
+            [
+                {"inline_data": {"mime_type": DESCRIPTION_MIME_TYPE, "data": image_b64}},
+                prompt
+            ]
+        )
+        record_sent("gemini_description", len(image_b64))
+        text = strip_code_fences(response.text)
+
+        # Parsing the JSON response
+        try:
+            json.loads(text)
+            print("Successfully parsed JSON response")
+            return text
+        except json.JSONDecodeError:
+            return "Invalid JSON response: " + text
+    except Exception as err:
+        return "Error generating description: " + str(err)
+
+
+def _describe_group(images_b64, tone, lang):
+    """One multi-image prompt; falls back to one prompt per image if the answer does not line up"""
+    if len(images_b64) > 1:
+        parts = [description_prompt(tone, lang, count=len(images_b64))]
+        for number, image_b64 in enumerate(images_b64, start=1):
+            parts.append(f"Image {number}:")
+            parts.append({"inline_data": {"mime_type": DESCRIPTION_MIME_TYPE, "data": image_b64}})
+        try:
+            response = external_call("gemini_description", gemini_model(DESCRIPTION_MODEL).generate_content, parts)
+            record_sent("gemini_description", sum(len(image_b64) for image_b64 in images_b64))
+            listings = json.loads(strip_code_fences(response.text))
+            if isinstance(listings, list) and len(listings) == len(images_b64) \
+                    and all(isinstance(listing, dict) for listing in listings):
+                return [json.dumps(listing) for listing in listings]
+            print(f"Batch description returned {len(listings) if isinstance(listings, list) else 'no'} "
+                  f"listings for {len(images_b64)} images, describing one by one")
+        except Exception as e:
+            print(f"Batch description failed, describing one by one: {str(e)}")
+
+    return [describe_image_b64(image_b64, tone, lang) for image_b64 in images_b64]
+
+
+def generate_descriptions_batch(images, tone="professional", lang="en",
+                                batch_size=DESCRIPTION_BATCH_SIZE, concurrency=DESCRIPTION_CONCURRENCY):
+    """
+    Describe many images with few Gemini requests.
+
+    Images already in the description cache (or near-duplicates of cached
+    ones) are answered from it. The rest are downsized to DESCRIPTION_MAX_SIDE,
+    grouped batch_size per multi-image prompt, and up to concurrency prompts
+    run at once. Returns one
+    description per image, in order: the listing JSON text, or an error
+    message like describe_image_b64.
+    """
+    # Hash each image once for both the lookup and the store
+    keys = [image_key(image) if description_cache else None for image in images]
+    descriptions = [description_cache.get(key, tone, lang, DESCRIPTION_CACHE_VERSION) if description_cache else None
+                    for key in keys]
+    missing = [i for i, description in enumerate(descriptions) if description is None]
+
+    images_b64 = [description_image_b64(images[i]) for i in missing]
+    groups = [images_b64[i:i + max(1, batch_size)] for i in range(0, len(images_b64), max(1, batch_size))]
+    # Each group runs in a copy of this context so it sees the request budget
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups))),
+                            thread_name_prefix="describe") as executor:
+        futures = [executor.submit(contextvars.copy_context().run, _describe_group, group, tone, lang)
+                   for group in groups]
+    described = [future.result() for future in futures]
+
+    for i, description in zip(missing, (description for group in described for description in group)):
+        descriptions[i] = description
+        if description_cache and not is_description_error(description):
+            description_cache.put(keys[i], tone, lang, description, DESCRIPTION_CACHE_VERSION)
+    return descriptions
+
+
 class process_image:
+    # Images kept per session; chosen_image is restored from chosen_option
+    IMAGE_FIELDS = (
+        "raw_image",
+        "cropped_image",
+        "alpha_mask",
+        "no_background_image",
+        "enhanced_image_1",
+        "enhanced_image_2",
+        "enhanced_image_3",
+    )
+
     def __init__(self):
         self.image_path = None
         self.raw_image = None
         self.detected_objects = []
+        self.crop_box = None
         self.cropped_image = None
+        self.alpha_mask = None
         self.no_background_image = None
         self.enhanced_image_1 = None
         self.enhanced_image_2 = None
         self.enhanced_image_3 = None
+        self.option_status = {}
         self.chosen_image = None
+        self.chosen_option = None
         self.description = ""
+        self.descriptions = []
+        self.image_versions = {}
 
     def detect_object(self):
-        processor = OwlViTProcessor.from_pretrained("google/owlvit-base-patch32")
-        model = OwlViTForObjectDetection.from_pretrained("google/owlvit-base-patch32")
-        texts = [[
-            # Giyim
-            "clothing",
-            "topwear",
-            "bottomwear",
-            "outerwear",
-            "apparel",
-            "sportswear",
-            "uniform",
-            "underwear",
-            "dress",
-            "outfit",
-
-            # Ayakkabı
-            "footwear",
-            "shoes",
-            "boots",
-            "sneakers",
-
-            # Aksesuarlar
-            "accessory",
-            "bag",
-            "backpack",
-            "handbag",
-            "wallet",
-            "belt",
-            "hat",
-            "cap",
-            "scarf",
-            "glasses",
-            "watch",
-            "jewelry",
-
-            # Elektronik
-            "electronics",
-            "device",
-            "gadget",
-            "smartphone",
-            "laptop",
-            "tablet",
-            "headphones",
-            "smartwatch",
-
-            # Kozmetik / Kişisel Bakım
-            "cosmetics",
-            "beauty product",
-            "skincare",
-            "makeup",
-            "perfume",
-            "hair product",
-
-            # Bebek ve çocuk
-            "baby product",
-            "baby clothes",
-            "toy",
-            "stroller",
-            "pacifier",
-
-            # Ev ve yaşam
-            "home item",
-            "furniture",
-            "appliance",
-            "decor",
-            "kitchenware",
-            "bedding",
-            "cleaning tool",
-
-            # Spor ve outdoor
-            "sports gear",
-            "fitness equipment",
-            "gym accessory",
-            "camping gear",
-            "bicycle equipment"
-            ]
-        ]
-
-        inputs = processor(text=texts, images=self.raw_image, return_tensors="pt")
+        detector = model_registry.get("owlvit")
+        results = detector.detect(self.raw_image, threshold=0.2)
+        self.detected_objects, self.crop_box = select_crop_box(results)
+        self.cropped_image = crop_to_box(self.raw_image, self.crop_box)
 
-        with torch.no_grad():
-            outputs = model(**inputs)
-
-        target_sizes = torch.tensor([self.raw_image.size[::-1]])
-        results = processor.post_process_grounded_object_detection(
-            outputs=outputs,
-            target_sizes=target_sizes,
-            threshold=0.2
-        )[0]
-        self.detected_objects = results["labels"].tolist()
-        
-        # Collect all valid bounding boxes
-        valid_boxes = []
-        detected_labels = []
-        for score, label_id, box in zip(results["scores"], results["labels"], results["boxes"]):
-            if score < 0.05:
-                continue 
-            valid_boxes.append(box.tolist())
-            detected_labels.append(texts[0][label_id])
-        
-        if len(valid_boxes) == 0:
-            self.cropped_image = self.raw_image
-        elif len(valid_boxes) == 1:
-            # Single object detected
-            xmin, ymin, xmax, ymax = map(int, valid_boxes[0])
-            self.cropped_image = self.raw_image.crop((xmin, ymin, xmax, ymax))
-            print(f"Single object detected: {detected_labels[0]}")
-        else:
-            # Multiple objects detected and they are pairs      
-            similar_items = ['shoes', 'boots', 'sneakers', 'footwear', 'glasses', 'earrings', 
-                           'gloves', 'socks', 'jewelry', 'watch', 'bracelet']
-            clothing_items = ['clothing', 'topwear', 'bottomwear', 'dress', 'outfit', 'apparel']
-            
-            has_similar_items = any(any(item in label.lower() for item in similar_items) 
-                                  for label in detected_labels)
-            has_clothing_items = any(any(item in label.lower() for item in clothing_items) 
-                                   for label in detected_labels)
-            
-            if has_similar_items or has_clothing_items or len(valid_boxes) <= 3:
-                # Combining them
-                all_xmin = min(box[0] for box in valid_boxes)
-                all_ymin = min(box[1] for box in valid_boxes)
-                all_xmax = max(box[2] for box in valid_boxes)
-                all_ymax = max(box[3] for box in valid_boxes)
-            
-                self.cropped_image = self.raw_image.crop((all_xmin, all_ymin, all_xmax, all_ymax))
-            else: # If there are too many different objects
-                self.cropped_image = self.raw_image
-        
     def remove_background(self):
         if self.cropped_image is None:
             print("No cropped image available. Using entire image.")
             self.cropped_image = self.raw_image
 
-        self.no_background_image = remove(self.cropped_image)
+        segmenter = model_registry.get("rembg")
+        # The mask is kept so other backgrounds can be composited without re-running segmentation
+        self.no_background_image, self.alpha_mask = segmenter.remove_background(self.cropped_image)
+
+    def apply_segmentation(self, crop_box, detected_objects, alpha_mask):
+        """Restore detection and background removal results computed earlier for raw_image"""
+        self.detected_objects = detected_objects
+        self.crop_box = tuple(crop_box) if crop_box is not None else None
+        self.cropped_image = crop_to_box(self.raw_image, self.crop_box)
+        self.alpha_mask = alpha_mask
+        self.no_background_image = cutout_with_mask(self.cropped_image, alpha_mask)
+
+    def composite_on(self, background):
+        """Paste the segmented product onto a PIL background using the stored alpha mask"""
+        if self.alpha_mask is None:
+            raise ValueError("No alpha mask available. Remove the background first.")
+        combined_image = background.convert("RGB").resize(self.cropped_image.size)
+        combined_image.paste(self.cropped_image, (0, 0), mask=self.alpha_mask)
+        return combined_image
 
     def enhance_image_option1(self):
-        sharpened = self.no_background_image.filter(ImageFilter.UnsharpMask(
-            radius=1,
-            percent=120,
-            threshold=1
-        ))
-
-        enhancer = ImageEnhance.Contrast(sharpened)
-        contrast_enhanced = enhancer.enhance(1.1)  # 10% more contrast
-        
-        enhancer = ImageEnhance.Brightness(contrast_enhanced)
-        brightness_enhanced = enhancer.enhance(1.02)  # 2% brighter
-        
-        enhancer = ImageEnhance.Color(brightness_enhanced)
-        color_enhanced = enhancer.enhance(1.05)  # 5% more vibrant
- 
-        img_array = np.array(color_enhanced)
-        
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        denoised = cv2.bilateralFilter(img_bgr, 3, 10, 10)
-        img_rgb = cv2.cvtColor(denoised, cv2.COLOR_BGR2RGB)
-        
-        self.enhanced_image_1 = Image.fromarray(img_rgb)
-        scale = 1.5
-        original_size = self.enhanced_image_1.size
-        new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
-
-        self.enhanced_image_1 = self.enhanced_image_1.resize(new_size, Image.Resampling.LANCZOS)
+        self.enhanced_image_1 = self._enhance_option1(self.no_background_image)
         return self.enhanced_image_1
 
-    def enhance_image_option2(self):
-
-        client = Client("finegrain/finegrain-image-enhancer")
-
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        output_path = os.path.join(script_dir, "temp_image.png")
-
-        self.no_background_image.save(output_path)
-
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        temp_image_path = os.path.join(script_dir, "temp_image.png")
-        result = client.predict(
-                input_image=handle_file(temp_image_path),
-                prompt="",
-                negative_prompt="",
-                seed=0,
-                upscale_factor=2.6,
-                controlnet_scale=0.5,
-                controlnet_decay=0.6,
-                condition_scale=5,
-                tile_width=200,
-                tile_height=200,
-                denoise_strength=0,
-                num_inference_steps=23,
-                solver="DPMSolver",
-                api_name="/process"
-        )
-        # Get the image from result[1] - local file path, not a URL
-        image_path = result[1]
+    def _enhance_option1(self, image):
+        return enhance_option1(image)
 
-        self.enhanced_image_2 = Image.open(image_path)
+    def enhance_image_option2(self):
+        self.enhanced_image_2 = self._enhance_option2(self.no_background_image)
         return self.enhanced_image_2
+
+    def _enhance_option2(self, image):
+        # Remote finegrain Space or local tiled super-resolution, per UPSCALER_BACKEND
+        upscaler = model_registry.get("upscaler")
+        if upscaler.name == "finegrain":
+            return external_call("finegrain", upscaler.upscale, image)
+        return upscaler.upscale(image)
     
     def enhance_image_option3(self):
+        self.enhanced_image_3 = self._enhance_option3(self.no_background_image)
+        return self.enhanced_image_3
+
+    def _enhance_option3(self, image):
         enhancer = image_enhancement_option3_helper.image_enhancement_option3_helper(model=None)
-        self.enhanced_image_3 = enhancer.ai_enhanced_image_processing(self.no_background_image)
+        return enhancer.ai_enhanced_image_processing(image)
+
+    def enhance_all_options(self, timeouts=None, progress=None, on_result=None):
+        """
+        Run the three enhancement options concurrently.
+
+        Each option gets its own timeout in seconds (OPTION_TIMEOUTS by default),
+        counted from when it starts running, so options waiting for a free
+        worker under load do not time out unrun. Within a request budget, no
+        option outlives the budget. An option that fails or runs out of time
+        falls back to no_background_image.
+        progress, when given, is called as progress("option_N", status), and
+        on_result(N, image) is called as soon as option N is settled.
+        """
+        timeouts = {**OPTION_TIMEOUTS, **(timeouts or {})}
+        budget = remaining_budget()
+        budget_deadline = time.monotonic() + budget if budget is not None else None
+        options = {
+            1: self._enhance_option1,
+            2: self._enhance_option2,
+            3: self._enhance_option3,
+        }
+        started = {}
+
+        def run_option(number, enhance):
+            started[number] = time.monotonic()
+            if progress is not None:
+                progress(f"option_{number}", "running")
+            return enhance(source)
+
+        def settle(number, result, status):
+            setattr(self, f"enhanced_image_{number}", result)
+            self.option_status[number] = status
+            if progress is not None:
+                progress(f"option_{number}", status)
+            if on_result is not None:
+                on_result(number, result)
+
+        def deadline(number):
+            """Time option number must be settled by, or None while it is still queued"""
+            deadlines = [budget_deadline] if budget_deadline is not None else []
+            if number in started:
+                deadlines.append(started[number] + timeouts[number])
+            return min(deadlines) if deadlines else None
+
+        source = self.no_background_image
+        self.option_status = {}
+        # Each option runs in a copy of this context so it sees the request budget
+        pending = {number: _option_executor.submit(contextvars.copy_context().run, run_option, number, enhance)
+                   for number, enhance in options.items()}
+
+        # Settle options in completion order so callers can use the fastest one first
+        while pending:
+            now = time.monotonic()
+            for number in [n for n in pending if deadline(n) is not None and now >= deadline(n)]:
+                pending.pop(number).cancel()
+                print(f"Enhancement option {number} timed out")
+                settle(number, source, "failed")
+            if not pending:
+                break
+
+            deadlines = [deadline(n) for n in pending if deadline(n) is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            if any(n not in started for n in pending):
+                # Look again soon so a queued option's clock starts when it does
+                wait_for = min(wait_for, 0.1) if wait_for is not None else 0.1
+            done, _ = wait(list(pending.values()), timeout=wait_for, return_when=FIRST_COMPLETED)
+            for number in [n for n, future in pending.items() if future in done]:
+                future = pending.pop(number)
+                try:
+                    result = future.result()
+                    if result is None:
+                        raise ValueError("option returned no image")
+                    print(f"Enhancement option {number} completed")
+                    settle(number, result, "completed")
+                except Exception as e:
+                    print(f"Enhancement option {number} failed: {str(e)}")
+                    settle(number, source, "failed")
+
+        return self.get_enhanced_images()
 
     def generate_description_from_image(self, image_b64: str,
                                         tone: str = "professional",
                                         lang: str = "en") -> str:
-        
-        API_KEY = os.getenv("SECRET_API_KEY")
-
-        genai.configure(api_key=API_KEY) # ← ONLY this line
-
-        model = genai.GenerativeModel("gemini-2.0-flash-exp")  # Updated model name
-
-        prompt = (
-            f"Analyze this product image and generate an SEO-optimized e-commerce product listing in {lang}. "
-            f"Tone: {tone}. Respond ONLY with valid JSON (no markdown formatting) containing these exact keys: "
-            f"'title', 'description', 'features', 'tags'. "
-            f"The 'features' and 'tags' must be arrays of strings. "
-            f"Do not include any other text or formatting."
-        )
-
-        try:
-            response = model.generate_content(
-                [
-                    {"inline_data": {"mime_type": "image/jpeg", "data": image_b64}},
-                    prompt
-                ]
-            )
-            text = response.text.strip()
-            
-            # Remove markdown code blocks
-            if text.startswith("```json"):
-                text = text[7:]  # Remove ```json
-            if text.startswith("```"):
-                text = text[3:]   # Remove ```
-            if text.endswith("```"):
-                text = text[:-3]  # Remove trailing ```
-            
-            text = text.strip()
-            
-            # Parsing the JSON response
-            try:
-                parsed_json = json.loads(text)
-                print("Successfully parsed JSON response")
-                return text
-            except json.JSONDecodeError:
-                return "Invalid JSON response: " + text
-        except Exception as err:
-            return "Error generating description: " + str(err)
+        return describe_image_b64(image_b64, tone, lang)
     
 
     def choose_image(self, number: int):
@@ -289,58 +433,95 @@ class process_image:
             self.chosen_image = self.enhanced_image_3
         else:
             raise ValueError("Invalid image number. Choose 1, 2, or 3.")
+        self.chosen_option = number
         
 
-    def generate_description(self):
+    def generate_description(self, tone: str = "professional", lang: str = "en"):
+        """Describe the chosen image in one tone and language"""
+        return self.generate_descriptions([(tone, lang)])[0]["description"]
+
+    def generate_descriptions(self, variants):
+        """
+        Describe the chosen image once per (tone, lang) variant.
+
+        Variants are answered from the description cache where possible; the
+        rest share a single image encode and their model requests run
+        concurrently. Returns one {"tone", "lang", "description"} dict per
+        variant, in order; self.description is set to the first one.
+        """
         print("Starting description generation...")
         
         if self.chosen_image is None:
             print("Error: No image chosen for description generation")
             self.description = "Error: No image selected for description generation"
-            return self.description
+            self.descriptions = [{"tone": tone, "lang": lang, "description": self.description}
+                                 for tone, lang in variants]
+            return self.descriptions
         
         try:
-            print("Converting image to base64...")
-            from io import BytesIO
-            buffer = BytesIO()  
-            
-            # It handles RGBA images by converting to RGB
-            image_to_save = self.chosen_image
-            if image_to_save.mode == 'RGBA':
-                background = Image.new('RGB', image_to_save.size, (255, 255, 255))
-                background.paste(image_to_save, mask=image_to_save.split()[-1])  # Use alpha channel as mask
-                image_to_save = background
-            elif image_to_save.mode != 'RGB':
-                image_to_save = image_to_save.convert('RGB')
-            
-            image_to_save.save(buffer, format='JPEG', quality=95)
-            img_b64 = base64.b64encode(buffer.getvalue()).decode()
-            print(f"Image converted to base64, size: {len(img_b64)} characters")
-            
-            tone = "professional"
-            lang = "en"
-            self.description = self.generate_description_from_image(img_b64, tone, lang)
-
-
-            if len(self.description) > 15000:
-                self.description = self.description[:15000] + "..."
-
-            return self.description
+            # One hash of the chosen image serves every variant's lookup and store
+            key = image_key(self.chosen_image) if description_cache else None
+            descriptions = [description_cache.get(key, tone, lang, DESCRIPTION_CACHE_VERSION) if description_cache else None
+                            for tone, lang in variants]
+            missing = [i for i, description in enumerate(descriptions) if description is None]
+            if len(missing) < len(variants):
+                print(f"Reusing {len(variants) - len(missing)} cached description(s) of this (or a near-identical) image")
+
+            if missing:
+                print("Converting image to base64...")
+                img_b64 = description_image_b64(self.chosen_image)
+                print(f"Image converted to base64, size: {len(img_b64)} characters")
+
+                def describe(index):
+                    tone, lang = variants[index]
+                    return self.generate_description_from_image(img_b64, tone, lang)
+
+                # Each variant runs in a copy of this context so it sees the request budget
+                with ThreadPoolExecutor(max_workers=min(len(missing), DESCRIPTION_CONCURRENCY),
+                                        thread_name_prefix="describe") as executor:
+                    futures = {i: executor.submit(contextvars.copy_context().run, describe, i) for i in missing}
+                for i, future in futures.items():
+                    descriptions[i] = future.result()
+                    tone, lang = variants[i]
+                    if description_cache and not is_description_error(descriptions[i]):
+                        description_cache.put(key, tone, lang, descriptions[i], DESCRIPTION_CACHE_VERSION)
+
+            descriptions = [description[:15000] + "..." if len(description) > 15000 else description
+                            for description in descriptions]
         except Exception as e:
             print(f"Error in generate_description: {str(e)}")
             import traceback
             traceback.print_exc()
-            self.description = f"Error generating description: {str(e)}"
-            return self.description
-
-    def process(self, image_path):
-        if os.path.isabs(image_path):
+            descriptions = [f"Error generating description: {str(e)}"] * len(variants)
+
+        self.descriptions = [{"tone": tone, "lang": lang, "description": description}
+                             for (tone, lang), description in zip(variants, descriptions)]
+        self.description = descriptions[0]
+        return self.descriptions
+
+    def process(self, source):
+        """
+        Load the raw image from bytes, a PIL image, a file-like object or a path.
+
+        Relative paths are resolved against the script directory.
+        """
+        if isinstance(source, Image.Image):
+            self.raw_image = source.convert("RGB")
+            return
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = BytesIO(source)
+        if hasattr(source, "read"):
+            with Image.open(source) as image:
+                self.raw_image = image.convert("RGB")
+            return
+
+        if os.path.isabs(source):
             # If absolute path, use it directly
-            self.image_path = image_path
+            self.image_path = source
         else:
             # If relative path, join with script directory
             script_dir = os.path.dirname(os.path.abspath(__file__))
-            self.image_path = os.path.join(script_dir, image_path)
+            self.image_path = os.path.join(script_dir, source)
         
         self.raw_image = Image.open(self.image_path).convert("RGB")
 
@@ -348,4 +529,57 @@ class process_image:
         return self.enhanced_image_1, self.enhanced_image_2, self.enhanced_image_3
     
     def get_description(self):
-        return self.description
\ No newline at end of file
+        return self.description
+
+    def to_state(self):
+        """
+        Split the session into JSON metadata and the images to persist.
+
+        Fields that share an image object (e.g. an option that fell back to the
+        background-removed image) are stored once and recorded as aliases.
+        """
+        images = {}
+        aliases = {}
+        stored_by_id = {}
+        for name in self.IMAGE_FIELDS:
+            image = getattr(self, name)
+            if image is None:
+                continue
+            if id(image) in stored_by_id:
+                aliases[name] = stored_by_id[id(image)]
+            else:
+                stored_by_id[id(image)] = name
+                images[name] = image
+
+        metadata = {
+            "image_path": self.image_path,
+            "detected_objects": self.detected_objects,
+            "crop_box": list(self.crop_box) if self.crop_box is not None else None,
+            "chosen_option": self.chosen_option,
+            "description": self.description,
+            "descriptions": self.descriptions,
+            "image_versions": self.image_versions,
+            "aliases": aliases,
+        }
+        return metadata, images
+
+    @classmethod
+    def from_state(cls, metadata, images):
+        """Rebuild a session saved with to_state"""
+        processor = cls()
+        processor.image_path = metadata.get("image_path")
+        processor.detected_objects = metadata.get("detected_objects", [])
+        crop_box = metadata.get("crop_box")
+        processor.crop_box = tuple(crop_box) if crop_box is not None else None
+        processor.description = metadata.get("description", "")
+        processor.descriptions = metadata.get("descriptions", [])
+        processor.image_versions = metadata.get("image_versions", {})
+
+        for name, image in images.items():
+            setattr(processor, name, image)
+        for name, source in metadata.get("aliases", {}).items():
+            setattr(processor, name, images.get(source))
+
+        if metadata.get("chosen_option") is not None:
+            processor.choose_image(metadata["chosen_option"])
+        return processor
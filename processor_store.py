@@ -0,0 +1,397 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from PIL import Image
+
+
+def image_nbytes(image):
+    """Decoded size of a PIL image in bytes"""
+    return image.width * image.height * len(image.getbands())
+
+
+def processor_nbytes(processor):
+    """Sum of the image buffers held by a processor (shared images counted once)"""
+    seen = set()
+    total = 0
+    for value in vars(processor).values():
+        if hasattr(value, "getbands") and id(value) not in seen:
+            seen.add(id(value))
+            total += image_nbytes(value)
+    return total
+
+
+def stamp_image_versions(processor, fields=None):
+    """
+    Give the named image fields (all image fields by default) a new version.
+
+    processor.image_versions maps field names to these versions, so HTTP
+    responses can derive ETags without encoding the images.
+    """
+    if fields is None:
+        fields = [name for name, value in vars(processor).items() if hasattr(value, "getbands")]
+    version = uuid.uuid4().hex
+    versions = dict(getattr(processor, "image_versions", None) or {})
+    for name in fields:
+        versions[name] = version
+    processor.image_versions = versions
+
+
+class ProcessorStore(ABC):
+    """
+    Interface for processor session storage.
+
+    put() stores a new session, get() returns it (or None when unknown or
+    expired), update() persists changes to an existing session and delete()
+    removes it. update() takes the names of the image fields that changed so
+    backends that persist images only rewrite those. put() and update() stamp
+    new image versions (stamp_image_versions) for the images they store.
+    """
+
+    @abstractmethod
+    def put(self, processor_id, processor):
+        """Store a new session"""
+
+    @abstractmethod
+    def get(self, processor_id):
+        """Return the session, or None when it is unknown or expired"""
+
+    @abstractmethod
+    def update(self, processor_id, processor, image_fields=()):
+        """Persist changes to an existing session"""
+
+    @abstractmethod
+    def delete(self, processor_id):
+        """Remove a session; True if it existed"""
+
+    @abstractmethod
+    def __len__(self):
+        """Number of live sessions"""
+
+    @abstractmethod
+    def stats(self):
+        """Metrics for /status"""
+
+
+class MemoryProcessorStore(ProcessorStore):
+    """
+    In-process store for processor sessions.
+
+    Entries expire ttl_seconds after their last use, and the least recently used
+    entries are evicted whenever the image buffers held by the store exceed
+    max_bytes.
+    """
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024, ttl_seconds=1800):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # processor_id -> (processor, nbytes, last_access)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+
+    def put(self, processor_id, processor):
+        stamp_image_versions(processor)
+        self._store(processor_id, processor)
+
+    def _store(self, processor_id, processor):
+        nbytes = processor_nbytes(processor)
+        with self._lock:
+            self._remove(processor_id)
+            self._entries[processor_id] = (processor, nbytes, time.monotonic())
+            self._bytes += nbytes
+            self._expire()
+            # Never evict the entry that was just added
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._evictions += 1
+                print(f"Evicted processor {oldest_id} to stay within memory budget")
+
+    def get(self, processor_id):
+        """Return the processor, or None when it is unknown or expired"""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(processor_id)
+            if entry is None:
+                self._misses += 1
+                return None
+            processor, nbytes, _ = entry
+            self._entries[processor_id] = (processor, nbytes, time.monotonic())
+            self._entries.move_to_end(processor_id)
+            self._hits += 1
+            return processor
+
+    def update(self, processor_id, processor, image_fields=()):
+        """Re-account a processor whose images changed"""
+        stamp_image_versions(processor, image_fields)
+        self._store(processor_id, processor)
+
+    def delete(self, processor_id):
+        with self._lock:
+            return self._remove(processor_id)
+
+    def __len__(self):
+        with self._lock:
+            self._expire()
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "expirations": self._expirations,
+                "evictions": self._evictions,
+            }
+
+    def _remove(self, processor_id):
+        entry = self._entries.pop(processor_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        return True
+
+    def _expire(self):
+        """Drop entries idle for longer than the TTL (caller holds the lock)"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Entries are kept in access order, so expired ones are at the front
+        while self._entries:
+            processor_id, (_, _, last_access) = next(iter(self._entries.items()))
+            if last_access >= cutoff:
+                break
+            self._remove(processor_id)
+            self._expirations += 1
+
+
+class SQLiteProcessorStore(ProcessorStore):
+    """
+    On-disk store shared by every worker process on the host.
+
+    Images are written as compressed PNG files under directory/<processor_id>/
+    and session metadata is indexed in an SQLite database next to them, so any
+    worker can serve a session created by another one. Processors are rebuilt
+    with restore(metadata, images), e.g. process_image.from_state. TTL and the
+    byte budget (on-disk size, least recently used first) apply as in the
+    in-memory store.
+    """
+
+    def __init__(self, directory, restore, max_bytes=4 * 1024 * 1024 * 1024, ttl_seconds=1800,
+                 compress_level=3):
+        self.directory = directory
+        self.restore = restore
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compress_level = compress_level
+        self.db_path = os.path.join(directory, "processors.db")
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS processors ("
+                " processor_id TEXT PRIMARY KEY,"
+                " metadata TEXT NOT NULL,"
+                " images TEXT NOT NULL,"
+                " nbytes INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS processors_last_access ON processors (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed"""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _session_dir(self, processor_id):
+        # processor ids are generated uuids, but never let one escape the store
+        return os.path.join(self.directory, os.path.basename(processor_id))
+
+    def _write_images(self, processor_id, images):
+        session_dir = self._session_dir(processor_id)
+        os.makedirs(session_dir, exist_ok=True)
+        for name, image in images.items():
+            path = os.path.join(session_dir, f"{name}.png")
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            image.save(temp_path, format="PNG", compress_level=self.compress_level)
+            os.replace(temp_path, path)
+
+    def _disk_bytes(self, processor_id, names):
+        session_dir = self._session_dir(processor_id)
+        return sum(os.path.getsize(os.path.join(session_dir, f"{name}.png"))
+                   for name in names if os.path.exists(os.path.join(session_dir, f"{name}.png")))
+
+    def put(self, processor_id, processor):
+        stamp_image_versions(processor)
+        metadata, images = processor.to_state()
+        self._write_images(processor_id, images)
+        nbytes = self._disk_bytes(processor_id, images)
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO processors VALUES (?, ?, ?, ?, ?, ?)",
+                (processor_id, json.dumps(metadata), json.dumps(sorted(images)), nbytes, now, now)
+            )
+        self._expire_and_evict(keep=processor_id)
+
+    def get(self, processor_id):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT metadata, images, last_access FROM processors WHERE processor_id = ?",
+                (processor_id,)
+            ).fetchone()
+            if row is not None and row[2] < time.time() - self.ttl_seconds:
+                row = None
+            if row is not None:
+                db.execute("UPDATE processors SET last_access = ? WHERE processor_id = ?",
+                           (time.time(), processor_id))
+
+        with self._lock:
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if row is None:
+            return None
+
+        metadata = json.loads(row[0])
+        session_dir = self._session_dir(processor_id)
+        images = {}
+        try:
+            for name in json.loads(row[1]):
+                with Image.open(os.path.join(session_dir, f"{name}.png")) as image:
+                    image.load()
+                    images[name] = image
+        except FileNotFoundError:
+            # Evicted by another worker between the lookup and the read
+            return None
+        return self.restore(metadata, images)
+
+    def update(self, processor_id, processor, image_fields=()):
+        stamp_image_versions(processor, image_fields)
+        metadata, images = processor.to_state()
+        session_dir = self._session_dir(processor_id)
+        # Fields that used to be aliases of a changed image have no file of their own yet
+        changed = {name: image for name, image in images.items()
+                   if name in image_fields or not os.path.exists(os.path.join(session_dir, f"{name}.png"))}
+        if changed:
+            self._write_images(processor_id, changed)
+        nbytes = self._disk_bytes(processor_id, images)
+        with self._connect() as db:
+            db.execute(
+                "UPDATE processors SET metadata = ?, images = ?, nbytes = ?, last_access = ?"
+                " WHERE processor_id = ?",
+                (json.dumps(metadata), json.dumps(sorted(images)), nbytes, time.time(), processor_id)
+            )
+
+    def delete(self, processor_id):
+        with self._connect() as db:
+            deleted = db.execute("DELETE FROM processors WHERE processor_id = ?",
+                                 (processor_id,)).rowcount > 0
+        shutil.rmtree(self._session_dir(processor_id), ignore_errors=True)
+        return deleted
+
+    def __len__(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM processors WHERE last_access >= ?",
+                              (cutoff,)).fetchone()[0]
+
+    def stats(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as db:
+            entries, nbytes = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM processors WHERE last_access >= ?",
+                (cutoff,)
+            ).fetchone()
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "directory": self.directory,
+                "entries": entries,
+                "bytes": nbytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "expirations": self._expirations,
+                "evictions": self._evictions,
+            }
+
+    def _expire_and_evict(self, keep):
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as db:
+            expired = [row[0] for row in db.execute(
+                "SELECT processor_id FROM processors WHERE last_access < ?", (cutoff,))]
+            evicted = []
+            total = db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM processors"
+                               " WHERE last_access >= ?", (cutoff,)).fetchone()[0]
+            if total > self.max_bytes:
+                for processor_id, nbytes in db.execute(
+                        "SELECT processor_id, nbytes FROM processors WHERE last_access >= ?"
+                        " ORDER BY last_access", (cutoff,)).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    if processor_id == keep:
+                        continue
+                    evicted.append(processor_id)
+                    total -= nbytes
+            removed = expired + evicted
+            db.executemany("DELETE FROM processors WHERE processor_id = ?", [(i,) for i in removed])
+
+        for processor_id in removed:
+            shutil.rmtree(self._session_dir(processor_id), ignore_errors=True)
+        with self._lock:
+            self._expirations += len(expired)
+            self._evictions += len(evicted)
+
+
+def create_processor_store(restore=None):
+    """
+    Build the processor store from the environment.
+
+    PROCESSOR_STORE selects the backend ("memory" or "sqlite"); the sqlite
+    backend keeps its files in PROCESSOR_STORE_DIR and needs restore to rebuild
+    processors. PROCESSOR_STORE_MAX_MB and PROCESSOR_TTL_SECONDS apply to both.
+    """
+    backend = os.getenv("PROCESSOR_STORE", "memory").lower()
+    max_bytes = int(float(os.getenv("PROCESSOR_STORE_MAX_MB", "1024")) * 1024 * 1024)
+    ttl_seconds = int(os.getenv("PROCESSOR_TTL_SECONDS", "1800"))
+
+    if backend == "sqlite":
+        if restore is None:
+            raise ValueError("The sqlite processor store needs a restore function")
+        directory = os.getenv(
+            "PROCESSOR_STORE_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "processors")
+        )
+        return SQLiteProcessorStore(directory, restore, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    if backend != "memory":
+        raise ValueError(f"Unknown PROCESSOR_STORE backend: {backend}")
+    return MemoryProcessorStore(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
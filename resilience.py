@@ -0,0 +1,191 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+# Consecutive failures that open a service's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "60"))
+
+# Longest single call per external service, before the request budget is applied
+SERVICE_TIMEOUTS = {
+    "finegrain": float(os.getenv("FINEGRAIN_CALL_TIMEOUT_SECONDS", "110")),
+    "gemini_option3": float(os.getenv("GEMINI_OPTION3_TIMEOUT_SECONDS", "20")),
+    "gemini_description": float(os.getenv("GEMINI_DESCRIPTION_TIMEOUT_SECONDS", "30")),
+}
+
+# External calls run here so a caller can stop waiting at its deadline; a call
+# that overruns keeps its thread until the service answers
+_call_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("EXTERNAL_CALL_WORKERS", "16")),
+    thread_name_prefix="external-call"
+)
+
+_current_budget = contextvars.ContextVar("request_budget", default=None)
+
+
+class CircuitOpenError(Exception):
+    """The service failed repeatedly and is not being called for now"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call did not finish within its deadline"""
+
+
+class CircuitBreaker:
+    """
+    Per-service circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail immediately. After reset_timeout seconds one trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "closed" or (self.state == "half_open" and not self._trial_in_flight):
+                self._trial_in_flight = self.state == "half_open"
+                self.calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """An allowed call never reached the service; it neither closes nor opens the circuit"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Circuit for {self.name} opened after {self.consecutive_failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+            }
+
+
+class RequestBudget:
+    """Wall-clock budget shared by everything a single request does"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+
+@contextmanager
+def request_budget(seconds):
+    """Run the block under a budget of seconds; nested budgets cannot extend an outer one"""
+    budget = RequestBudget(seconds)
+    outer = _current_budget.get()
+    if outer is not None and outer.deadline < budget.deadline:
+        budget = outer
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def remaining_budget(default=None):
+    """Seconds left in the current request budget, or default outside of one"""
+    budget = _current_budget.get()
+    return budget.remaining() if budget is not None else default
+
+
+breakers = {name: CircuitBreaker(name) for name in SERVICE_TIMEOUTS}
+
+
+def _call_within(started, timeout, fn, *args, **kwargs):
+    started.set()
+    # The callee sees the call deadline as its request budget, so budget-aware
+    # clients (the Gradio pool) stop working when the caller stops waiting
+    with request_budget(timeout):
+        return fn(*args, **kwargs)
+
+
+def external_call(service, fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) for an external service under its circuit breaker.
+
+    The wait is limited to the service timeout or the rest of the request
+    budget, whichever is shorter, and fn runs under that deadline as its
+    request budget. The service timeout counts from when fn starts: time spent
+    waiting for a free worker only uses up the request budget and is never
+    recorded as a failure of the service. Raises CircuitOpenError without
+    calling fn while the circuit is open, and DeadlineExceeded when the
+    deadline passes.
+    """
+    timeout = min(SERVICE_TIMEOUTS[service], remaining_budget(SERVICE_TIMEOUTS[service]))
+    if timeout <= 0:
+        raise DeadlineExceeded(f"No request budget left for {service}")
+
+    breaker = breakers[service]
+    if not breaker.allow():
+        raise CircuitOpenError(f"{service} is unavailable (circuit open)")
+
+    started = threading.Event()
+    future = _call_executor.submit(contextvars.copy_context().run, _call_within, started, timeout, fn,
+                                   *args, **kwargs)
+    if not started.wait(remaining_budget(timeout)) and future.cancel():
+        breaker.release()
+        raise DeadlineExceeded(f"No free worker for {service} before the deadline")
+
+    timeout = min(timeout, remaining_budget(timeout))
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        breaker.record_failure()
+        raise DeadlineExceeded(f"{service} did not answer within {timeout:.1f}s")
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def resilience_stats():
+    return {
+        "circuits": {name: breaker.stats() for name, breaker in breakers.items()},
+        "timeouts": SERVICE_TIMEOUTS,
+    }
@@ -0,0 +1,83 @@
+import os
+import onnxruntime as ort
+from PIL import Image
+from rembg import remove
+from rembg.sessions import sessions_class
+
+# rembg model used for background removal (u2net, u2netp, isnet-general-use, silueta, ...)
+REMBG_MODEL = os.getenv("REMBG_MODEL", "u2net")
+# onnxruntime intra-op threads, 0 keeps the onnxruntime default
+REMBG_THREADS = int(os.getenv("REMBG_THREADS", "0"))
+# onnxruntime graph optimization level: disable, basic, extended or all
+REMBG_GRAPH_OPTIMIZATION = os.getenv("REMBG_GRAPH_OPTIMIZATION", "all")
+# Longest side the mask is inferred at; the mask is upsampled back to the crop size
+SEGMENTATION_MAX_SIDE = int(os.getenv("SEGMENTATION_MAX_SIDE", "1024"))
+
+# Identifies settings that change the mask, for caches of segmentation results
+SEGMENTATION_CACHE_TAG = f"{REMBG_MODEL}:{SEGMENTATION_MAX_SIDE}"
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def create_rembg_session(model_name=REMBG_MODEL, threads=REMBG_THREADS,
+                         graph_optimization=REMBG_GRAPH_OPTIMIZATION):
+    """Build a persistent rembg session with explicit onnxruntime options"""
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown graph optimization level: {graph_optimization}")
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    if threads > 0:
+        sess_opts.intra_op_num_threads = threads
+        sess_opts.inter_op_num_threads = 1
+
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class(model_name, sess_opts)
+    raise ValueError(f"Unknown rembg model: {model_name}")
+
+
+def cutout_with_mask(image, mask):
+    """Cut the image out with an L mask, the same way rembg builds its cutout"""
+    empty = Image.new("RGBA", image.size, 0)
+    return Image.composite(image.convert("RGBA"), empty, mask)
+
+
+class Segmenter:
+    """
+    Background removal with a persistent rembg session.
+
+    The mask is inferred on a copy downscaled to max_side (U2-Net itself works
+    at 320px, so full-resolution camera crops only cost decode and resize time)
+    and then upsampled to the original size.
+    """
+
+    def __init__(self, session, max_side=SEGMENTATION_MAX_SIDE):
+        self.session = session
+        self.max_side = max_side
+
+    def mask(self, image):
+        """Return the foreground mask (mode L) at the size of image"""
+        small = image
+        if self.max_side and max(image.size) > self.max_side:
+            small = image.copy()
+            small.thumbnail((self.max_side, self.max_side), Image.Resampling.BILINEAR)
+
+        mask = remove(small, session=self.session, only_mask=True)
+        if mask.size != image.size:
+            mask = mask.resize(image.size, Image.Resampling.BILINEAR)
+        return mask
+
+    def remove_background(self, image):
+        """Return (RGBA cutout, alpha mask) for image"""
+        mask = self.mask(image)
+        return cutout_with_mask(image, mask), mask
+
+
+def load_segmenter():
+    return Segmenter(create_rembg_session())
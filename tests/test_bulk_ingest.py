@@ -0,0 +1,37 @@
+import io
+import json
+import zipfile
+
+from bulk_ingest import BulkIngestion, iter_manifest, iter_zip
+
+
+def test_uploaded_manifest_cannot_use_paths_or_urls():
+    lines = [json.dumps({"id": "a", "url": "http://169.254.169.254/"}), json.dumps({"id": "b", "path": "x.png"})]
+    results = list(iter_manifest(lines, allow_paths=False, allow_urls=False))
+
+    assert [item_id for item_id, _ in results] == ["a", "b"]
+    assert all(isinstance(data, ValueError) for _, data in results)
+
+
+def test_oversized_zip_members_are_not_read():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("big.png", b"\0" * 2_000_000)
+        zf.writestr("small.png", b"ok")
+        zf.writestr("notes.txt", b"skipped")
+    results = dict(iter_zip(archive, max_member_bytes=1_000_000))
+
+    assert isinstance(results["big.png"], ValueError)
+    assert results["small.png"] == b"ok"
+    assert "notes.txt" not in results
+
+
+def test_rerun_replaces_results(tmp_path):
+    source = [("a.png", ValueError("unreadable")), ("b.png", ValueError("unreadable"))]
+    for _ in range(2):
+        summary = BulkIngestion(str(tmp_path), describe=False).run(iter(source))
+
+    with open(summary["results"], encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["id"] for record in records] == ["a.png", "b.png"]
+    assert all(record["status"] == "failed" for record in records)
@@ -0,0 +1,42 @@
+import os
+import time
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("gradio")
+
+import app  # noqa: E402
+
+
+def test_run_id_must_be_a_uuid():
+    assert app.is_run_id(str(uuid.uuid4()))
+    assert not app.is_run_id("..")
+    assert not app.is_run_id("../../etc")
+
+
+def make_run(base, catalog=False, age=0):
+    run_dir = base / str(uuid.uuid4())
+    (run_dir / "output").mkdir(parents=True)
+    results = run_dir / "output" / "results.ndjson"
+    results.write_text("{}\n")
+    if catalog:
+        (run_dir / "catalog.zip").write_bytes(b"")
+    stamp = time.time() - age
+    os.utime(results, (stamp, stamp))
+    return run_dir
+
+
+def test_purge_removes_only_expired_finished_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "BULK_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "BULK_OUTPUT_TTL_SECONDS", 60)
+    expired = make_run(tmp_path, age=120)
+    recent = make_run(tmp_path, age=10)
+    running = make_run(tmp_path, catalog=True, age=120)
+
+    app.purge_bulk_runs()
+
+    assert not expired.exists()
+    assert recent.exists()
+    assert running.exists()
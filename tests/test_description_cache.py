@@ -0,0 +1,48 @@
+import sqlite3
+
+from PIL import Image, ImageDraw
+
+from description_cache import DescriptionCache, image_key
+
+
+def product(colour, size=200):
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    ImageDraw.Draw(image).ellipse((size // 5, size // 5, size * 4 // 5, size * 4 // 5), fill=colour)
+    return image
+
+
+def test_same_shape_in_another_colour_misses(tmp_path):
+    cache = DescriptionCache(str(tmp_path / "descriptions.sqlite3"))
+    cache.put(image_key(product((200, 30, 30, 255))), "professional", "en", "red mug", "model/1")
+
+    assert cache.get(image_key(product((200, 30, 30, 255))), "professional", "en", "model/1") == "red mug"
+    assert cache.get(image_key(product((205, 33, 30, 255))), "professional", "en", "model/1") == "red mug"
+    assert cache.get(image_key(product((30, 200, 30, 255))), "professional", "en", "model/1") is None
+
+
+def test_other_version_or_locale_misses(tmp_path):
+    cache = DescriptionCache(str(tmp_path / "descriptions.sqlite3"))
+    key = image_key(product((200, 30, 30, 255)))
+    cache.put(key, "professional", "en", "red mug", "model/1")
+
+    assert cache.get(key, "professional", "en", "model/2") is None
+    assert cache.get(key, "professional", "de", "model/1") is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "descriptions.sqlite3")
+    key = image_key(product((200, 30, 30, 255)))
+    DescriptionCache(path).put(key, "professional", "en", "red mug", "model/1")
+
+    assert DescriptionCache(path).get(key, "professional", "en", "model/1") == "red mug"
+
+
+def test_unrelated_tables_are_left_alone(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE descriptions (id INTEGER)")
+    DescriptionCache(path)
+
+    with sqlite3.connect(path) as db:
+        tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"descriptions", "description_entries"} <= tables
@@ -0,0 +1,28 @@
+import pytest
+from PIL import Image
+
+process_image = pytest.importorskip("process_image")
+
+from resilience import remaining_budget, request_budget  # noqa: E402
+
+
+def test_batch_groups_see_the_request_budget(monkeypatch):
+    monkeypatch.setattr(process_image, "description_cache", None)
+    monkeypatch.setattr(process_image, "_describe_group",
+                        lambda images_b64, tone, lang: [str(remaining_budget()) for _ in images_b64])
+    images = [Image.new("RGB", (16, 16), (i * 40, 0, 0)) for i in range(4)]
+
+    with request_budget(30):
+        descriptions = process_image.generate_descriptions_batch(images, batch_size=2, concurrency=2)
+
+    assert len(descriptions) == 4
+    assert all(description != "None" and float(description) > 0 for description in descriptions)
+
+
+def test_group_falls_back_to_single_descriptions_without_a_processor(monkeypatch):
+    calls = []
+    monkeypatch.setattr(process_image, "describe_image_b64",
+                        lambda image_b64, tone, lang: calls.append(image_b64) or '{"title": "t"}')
+
+    assert process_image._describe_group(["a"], "professional", "en") == ['{"title": "t"}']
+    assert calls == ["a"]
@@ -0,0 +1,117 @@
+import io
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("fastapi")
+pytest.importorskip("gradio")
+
+import app  # noqa: E402
+from pipeline_cache import PipelineCache  # noqa: E402
+
+
+class FakeProcessor:
+    """Stands in for process_image without loading any model"""
+
+    runs = 0
+
+    def __init__(self):
+        self.raw_image = None
+        self.crop_box = None
+        self.detected_objects = []
+        self.alpha_mask = None
+        self.no_background_image = None
+        self.enhanced_image_1 = self.enhanced_image_2 = self.enhanced_image_3 = None
+        self.option_status = {}
+
+    def process(self, source):
+        self.raw_image = Image.open(io.BytesIO(source)).convert("RGB")
+
+    def detect_object(self):
+        self.detected_objects = [0]
+        self.crop_box = (0, 0, self.raw_image.width, self.raw_image.height)
+
+    def remove_background(self):
+        self.alpha_mask = Image.new("L", self.raw_image.size, 255)
+        self.no_background_image = self.raw_image.convert("RGBA")
+
+    def apply_segmentation(self, crop_box, detected_objects, alpha_mask):
+        self.crop_box = tuple(crop_box)
+        self.detected_objects = detected_objects
+        self.alpha_mask = alpha_mask
+        self.no_background_image = self.raw_image.convert("RGBA")
+
+    def enhance_all_options(self, progress=None, on_result=None):
+        FakeProcessor.runs += 1
+        for number in (1, 2, 3):
+            setattr(self, f"enhanced_image_{number}", self.no_background_image.copy())
+            self.option_status[number] = "completed"
+        return self.get_enhanced_images()
+
+    def get_enhanced_images(self):
+        return self.enhanced_image_1, self.enhanced_image_2, self.enhanced_image_3
+
+
+class FakeStore(dict):
+    def put(self, processor_id, processor):
+        self[processor_id] = processor
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    FakeProcessor.runs = 0
+    monkeypatch.setattr(app, "process_image", FakeProcessor, raising=False)
+    monkeypatch.setattr(app, "pipeline_cache", PipelineCache(str(tmp_path)))
+    monkeypatch.setattr(app, "processors", FakeStore())
+    monkeypatch.setattr(app, "SEGMENTATION_CACHE_TAG", "fake", raising=False)
+    monkeypatch.setattr(app, "UPSCALER_BACKEND", "finegrain", raising=False)
+    monkeypatch.setattr(app, "UPSCALE_FACTOR", 2.6, raising=False)
+    monkeypatch.setattr(app, "UPSCALER_MODEL_PATH", "", raising=False)
+    monkeypatch.setattr(app, "OPTION3_PLANNER", "local", raising=False)
+
+    def run(image_bytes):
+        stages = []
+        processor_id, processor = app._enhancement_pipeline(
+            image_bytes, None, lambda stage, status: stages.append((stage, status)), lambda name, image: None
+        )
+        return processor_id, processor, dict(stages)
+
+    return run
+
+
+def png_bytes(colour):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 24), colour).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_pipeline_runs_with_cache_enabled(pipeline):
+    processor_id, processor, stages = pipeline(png_bytes((200, 30, 30)))
+
+    assert processor_id in app.processors
+    assert processor.enhanced_image_2.size == (32, 24)
+    assert stages["detect_objects"] == "completed"
+    assert FakeProcessor.runs == 1
+
+
+def test_repeated_upload_is_served_from_cache(pipeline):
+    image_bytes = png_bytes((200, 30, 30))
+    pipeline(image_bytes)
+    _, processor, stages = pipeline(image_bytes)
+
+    assert stages["detect_objects"] == "cached"
+    assert stages["option_1"] == "cached"
+    assert FakeProcessor.runs == 1
+    assert processor.enhanced_image_1.size == (32, 24)
+
+
+def test_finegrain_payload_size_is_part_of_the_options_key(pipeline, monkeypatch):
+    image_bytes = png_bytes((30, 200, 30))
+    pipeline(image_bytes)
+    monkeypatch.setattr(app.PAYLOAD_POLICIES["finegrain"], "max_side",
+                        app.PAYLOAD_POLICIES["finegrain"].max_side * 2)
+    _, _, stages = pipeline(image_bytes)
+
+    assert stages["detect_objects"] == "cached"
+    assert stages.get("option_1") != "cached"
+    assert FakeProcessor.runs == 2
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("cv2")
+
+from image_statistics import compute_image_statistics  # noqa: E402
+
+
+def rgba(alpha):
+    array = np.zeros((20, 20, 4), dtype=np.uint8)
+    array[..., :3] = 120
+    array[..., 3] = alpha
+    return Image.fromarray(array, "RGBA")
+
+
+def test_fully_transparent_image_has_no_foreground():
+    assert compute_image_statistics(rgba(0))["foreground_coverage"] == 0.0
+
+
+def test_coverage_counts_opaque_pixels():
+    alpha = np.zeros((20, 20), dtype=np.uint8)
+    alpha[:10] = 255
+    assert compute_image_statistics(rgba(alpha))["foreground_coverage"] == 0.5
+
+
+def test_opaque_image_is_fully_covered():
+    stats = compute_image_statistics(Image.new("RGB", (20, 20), (120, 120, 120)))
+    assert stats["foreground_coverage"] == 1.0
+    assert stats["mean_brightness"] == pytest.approx(120, abs=1)
@@ -0,0 +1,25 @@
+from PIL import Image
+
+from pipeline_cache import PipelineCache
+
+
+def test_key_accepts_settings_of_any_type():
+    key = PipelineCache.key("image", None, "4", "finegrain", 2.6, "", 1024, "local")
+    assert key == PipelineCache.key("image", None, "4", "finegrain", 2.6, "", 1024, "local")
+    assert key != PipelineCache.key("image", None, "4", "finegrain", 3.0, "", 1024, "local")
+    assert key != PipelineCache.key("image", None, "4", "finegrain", 2.6, "", 2048, "local")
+
+
+def test_key_depends_on_part_order():
+    assert PipelineCache.key(b"a", "b") != PipelineCache.key("b", b"a")
+
+
+def test_put_then_get_round_trips_data_and_images(tmp_path):
+    cache = PipelineCache(str(tmp_path))
+    key = PipelineCache.key(b"image bytes", "1")
+    cache.put(key, "segmentation", {"crop_box": [1, 2, 3, 4]}, {"alpha_mask": Image.new("L", (4, 4), 255)})
+
+    data, images = cache.get(key, "segmentation")
+    assert data == {"crop_box": [1, 2, 3, 4]}
+    assert images["alpha_mask"].size == (4, 4)
+    assert cache.get(key, "options") is None
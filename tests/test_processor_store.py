@@ -0,0 +1,57 @@
+import pytest
+from PIL import Image
+
+from processor_store import MemoryProcessorStore, ProcessorStore, SQLiteProcessorStore
+
+
+class Session:
+    """Minimal processor with the to_state/from_state contract of process_image"""
+
+    IMAGE_FIELDS = ("no_background_image", "enhanced_image_1")
+
+    def __init__(self):
+        self.no_background_image = Image.new("RGBA", (8, 8), (255, 0, 0, 255))
+        self.enhanced_image_1 = Image.new("RGB", (8, 8), (0, 255, 0))
+        self.image_versions = {}
+
+    def to_state(self):
+        images = {name: getattr(self, name) for name in self.IMAGE_FIELDS}
+        return {"image_versions": self.image_versions}, images
+
+    @classmethod
+    def from_state(cls, metadata, images):
+        session = cls()
+        for name, image in images.items():
+            setattr(session, name, image)
+        session.image_versions = metadata["image_versions"]
+        return session
+
+
+def check_versions(store):
+    session = Session()
+    store.put("p1", session)
+    first = dict(session.image_versions)
+    assert set(first) == {"no_background_image", "enhanced_image_1"}
+
+    session.no_background_image = Image.new("RGBA", (8, 8), (0, 0, 255, 255))
+    store.update("p1", session, ("no_background_image",))
+    stored = store.get("p1").image_versions
+    assert stored["no_background_image"] != first["no_background_image"]
+    assert stored["enhanced_image_1"] == first["enhanced_image_1"]
+
+
+def test_memory_store_stamps_changed_images():
+    check_versions(MemoryProcessorStore())
+
+
+def test_sqlite_store_stamps_changed_images(tmp_path):
+    check_versions(SQLiteProcessorStore(str(tmp_path), restore=Session.from_state))
+
+
+def test_incomplete_backend_fails_when_instantiated():
+    class GetOnlyStore(ProcessorStore):
+        def get(self, processor_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore()
@@ -0,0 +1,48 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, DeadlineExceeded, external_call, remaining_budget, request_budget
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setitem(resilience.SERVICE_TIMEOUTS, "test", 0.3)
+    monkeypatch.setitem(resilience.breakers, "test", CircuitBreaker("test", failure_threshold=1))
+    monkeypatch.setattr(resilience, "_call_executor", ThreadPoolExecutor(max_workers=1))
+    return resilience.breakers["test"]
+
+
+def test_callee_runs_under_the_call_deadline(service):
+    with request_budget(5):
+        assert 0 < external_call("test", remaining_budget) <= 0.3
+
+
+def test_slow_service_is_recorded_as_failure(service):
+    with pytest.raises(DeadlineExceeded):
+        external_call("test", time.sleep, 1)
+    assert service.state == "open"
+
+
+def test_waiting_for_a_worker_is_not_a_service_failure(service):
+    release = threading.Event()
+    resilience._call_executor.submit(release.wait)
+    try:
+        with request_budget(0.2), pytest.raises(DeadlineExceeded):
+            external_call("test", lambda: "never runs")
+    finally:
+        release.set()
+    assert service.state == "closed"
+    assert service.failures == 0
+
+
+def test_timeout_counts_from_when_the_call_starts(service):
+    release = threading.Event()
+    resilience._call_executor.submit(release.wait)
+    threading.Timer(0.2, release.set).start()
+    # Queued for 0.2s, then takes 0.2s of its own 0.3s timeout
+    assert external_call("test", lambda: time.sleep(0.2) or "done") == "done"
+    assert service.state == "closed"
@@ -0,0 +1,174 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+import cv2
+import numpy as np
+from PIL import Image
+from gradio_pool import GradioClientPool
+from payloads import prepare_payload, record_sent
+
+# Which upscaler enhancement option 2 uses: "finegrain" (remote Gradio Space) or "local"
+UPSCALER_BACKEND = os.getenv("UPSCALER_BACKEND", "finegrain").lower()
+UPSCALE_FACTOR = float(os.getenv("UPSCALE_FACTOR", "2.6"))
+
+# Local backend: optional ONNX super-resolution model (NCHW float RGB in [0, 1],
+# e.g. an ESRGAN export) run tile by tile; without one, Lanczos plus detail sharpening
+UPSCALER_MODEL_PATH = os.getenv("UPSCALER_MODEL_PATH", "")
+UPSCALER_TILE_SIZE = int(os.getenv("UPSCALER_TILE_SIZE", "256"))
+UPSCALER_TILE_OVERLAP = int(os.getenv("UPSCALER_TILE_OVERLAP", "16"))
+UPSCALER_THREADS = int(os.getenv("UPSCALER_THREADS", "0"))
+
+
+class Upscaler(ABC):
+    """Interface of the option 2 upscaling backends"""
+
+    name = "base"
+
+    @abstractmethod
+    def upscale(self, image):
+        """Return an upscaled copy of a PIL image"""
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class FinegrainSpaceUpscaler(Upscaler):
+    """The finegrain image enhancer Space on Hugging Face, called through gradio_client"""
+
+    name = "finegrain"
+
+    def __init__(self, space="finegrain/finegrain-image-enhancer", upscale_factor=UPSCALE_FACTOR):
+        self.space = space
+        self.upscale_factor = upscale_factor
+        self.pool = GradioClientPool(space)
+
+    def upscale(self, image):
+        from gradio_client import handle_file
+
+        # The Gradio client uploads from a path, so use a unique file per request
+        payload = prepare_payload("finegrain", image)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_image:
+            temp_image.write(payload.data)
+            temp_image_path = temp_image.name
+
+        try:
+            result = self.pool.predict(
+                    input_image=handle_file(temp_image_path),
+                    prompt="",
+                    negative_prompt="",
+                    seed=0,
+                    upscale_factor=self.upscale_factor,
+                    controlnet_scale=0.5,
+                    controlnet_decay=0.6,
+                    condition_scale=5,
+                    tile_width=200,
+                    tile_height=200,
+                    denoise_strength=0,
+                    num_inference_steps=23,
+                    solver="DPMSolver",
+                    api_name="/process"
+            )
+        finally:
+            os.unlink(temp_image_path)
+        record_sent("finegrain", len(payload.data))
+
+        # Get the image from result[1] - local file path, not a URL
+        image_path = result[1]
+
+        with Image.open(image_path) as enhanced:
+            enhanced.load()
+            return enhanced
+
+    def stats(self):
+        return {"backend": self.name, **self.pool.stats()}
+
+
+class LocalTiledUpscaler(Upscaler):
+    """
+    CPU super-resolution with bounded memory and latency.
+
+    With an ONNX model the image is processed in tile_size tiles, each padded by
+    overlap pixels of context that are cropped away again so tile seams do not
+    show. The model's native scale is detected from its output and the result
+    is resized to upscale_factor. Without a model, a Lanczos resize followed by
+    a light unsharp mask is used. Alpha is resized separately with Lanczos.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path=UPSCALER_MODEL_PATH, upscale_factor=UPSCALE_FACTOR,
+                 tile_size=UPSCALER_TILE_SIZE, overlap=UPSCALER_TILE_OVERLAP, threads=UPSCALER_THREADS):
+        self.upscale_factor = upscale_factor
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.session = None
+        if model_path:
+            import onnxruntime as ort
+
+            sess_opts = ort.SessionOptions()
+            if threads > 0:
+                sess_opts.intra_op_num_threads = threads
+                sess_opts.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(model_path, sess_opts, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+
+    def upscale(self, image):
+        has_alpha = "A" in image.getbands()
+        rgba = np.asarray(image.convert("RGBA" if has_alpha else "RGB"))
+        rgb = np.ascontiguousarray(rgba[..., :3])
+
+        height, width = rgb.shape[:2]
+        target_size = (round(width * self.upscale_factor), round(height * self.upscale_factor))
+
+        if self.session is not None:
+            upscaled = self._run_tiled(rgb)
+            if (upscaled.shape[1], upscaled.shape[0]) != target_size:
+                upscaled = cv2.resize(upscaled, target_size, interpolation=cv2.INTER_AREA
+                                      if upscaled.shape[1] > target_size[0] else cv2.INTER_LANCZOS4)
+        else:
+            upscaled = cv2.resize(rgb, target_size, interpolation=cv2.INTER_LANCZOS4)
+            blurred = cv2.GaussianBlur(upscaled, (0, 0), 1.0)
+            upscaled = cv2.addWeighted(upscaled, 1.5, blurred, -0.5, 0)
+
+        if has_alpha:
+            alpha = cv2.resize(np.ascontiguousarray(rgba[..., 3]), target_size, interpolation=cv2.INTER_LANCZOS4)
+            return Image.fromarray(np.dstack([upscaled, alpha]), "RGBA")
+        return Image.fromarray(upscaled, "RGB")
+
+    def _run_tile(self, tile):
+        batch = np.ascontiguousarray(tile.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+        output = self.session.run(None, {self.input_name: batch})[0][0]
+        return np.clip(output.transpose(1, 2, 0) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+    def _run_tiled(self, rgb):
+        height, width = rgb.shape[:2]
+        tile, overlap = self.tile_size, self.overlap
+        output = None
+        scale = None
+
+        for y in range(0, height, tile):
+            for x in range(0, width, tile):
+                # Core region of this tile and the padded region fed to the model
+                y1, x1 = min(y + tile, height), min(x + tile, width)
+                py0, px0 = max(y - overlap, 0), max(x - overlap, 0)
+                py1, px1 = min(y1 + overlap, height), min(x1 + overlap, width)
+
+                result = self._run_tile(rgb[py0:py1, px0:px1])
+                if output is None:
+                    scale = result.shape[0] // (py1 - py0)
+                    output = np.empty((height * scale, width * scale, 3), dtype=np.uint8)
+
+                output[y * scale:y1 * scale, x * scale:x1 * scale] = result[
+                    (y - py0) * scale:(y1 - py0) * scale,
+                    (x - px0) * scale:(x1 - px0) * scale
+                ]
+        return output
+
+
+def load_upscaler():
+    """Build the option 2 upscaler selected by UPSCALER_BACKEND"""
+    if UPSCALER_BACKEND == "local":
+        return LocalTiledUpscaler()
+    if UPSCALER_BACKEND == "finegrain":
+        return FinegrainSpaceUpscaler()
+    raise ValueError(f"Unknown UPSCALER_BACKEND: {UPSCALER_BACKEND}")